@@ -0,0 +1,27 @@
+# Django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+# Local apps
+from accounts.cache import get_session_user
+
+
+UserModel = get_user_model()
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend reading the user of a session from the cache, loaded along
+    with its author in one query on cache miss, so neither the user nor
+    request.user.author cost a query on most requests.
+
+    AuthenticationMiddleware already resolves request.user once per request.
+    """
+
+    def get_user(self, user_id):
+        user = get_session_user(
+            user_id,
+            lambda: UserModel._default_manager.select_related('author')
+            .filter(pk=user_id).first()
+        )
+        return user if user is not None and self.user_can_authenticate(user) else None
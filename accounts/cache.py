@@ -0,0 +1,42 @@
+"""
+Module for the cached session users, refer to accounts/backends.py.
+
+Each user is cached under its own key, dropped by the User and Author
+receivers of accounts/signals.py and by the unread notifications counter
+updates of posts.counters, so changes of one user never evict the others.
+"""
+
+# Django
+from django.core.cache import cache
+from django.db import transaction
+
+
+SESSION_USER_TIMEOUT = 60 * 60
+
+SESSION_USER_KEY = 'accounts:user:{}'
+
+
+def get_session_user(user_id, load_user):
+    """
+    Return the cached user of id user_id, load_user is called to read it on
+    cache miss.
+    """
+    key = SESSION_USER_KEY.format(user_id)
+
+    user = cache.get(key)
+    if user is None:
+        user = load_user()
+        if user is not None:
+            cache.set(key, user, SESSION_USER_TIMEOUT)
+
+    return user
+
+
+def invalidate_session_users(user_ids):
+    """
+    Drop the cached users of user_ids once the transaction commits, a request
+    reading them before the commit would otherwise cache the old rows again.
+    """
+    keys = [SESSION_USER_KEY.format(user_id) for user_id in user_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,20 @@
+# Django
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+# Local apps
+from accounts.cache import invalidate_session_users
+from posts.models import Author
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_session_user_on_user_change(sender, instance, **kwargs):
+    invalidate_session_users([instance.pk])
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_session_user_on_author_change(sender, instance, **kwargs):
+    invalidate_session_users([instance.name_id])
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blog.settings')
+# Streamed responses read their rows within a thread, refer to posts/export.py.
+os.environ.setdefault('BLOG_SERVER', 'asgi')
 
 application = get_asgi_application()
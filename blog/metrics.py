@@ -0,0 +1,236 @@
+"""
+Lightweight per-view metrics, meant to stay on in production: SQL queries
+count, database time, template render time and total latency of every
+request, aggregated in memory by URL name.
+
+- RequestMetricsMiddleware measures each request and logs the slow ones
+  (settings.SLOW_REQUEST_SECONDS) to the 'blog.metrics' logger.
+- record_query, an execute_wrapper added to every database connection when
+  it's created, so queries of the worker threads of async views count too.
+- TimedDjangoTemplates, the template backend (settings.TEMPLATES), times each
+  top-level render, includes are part of their parent render.
+- metrics_view, staff-only JSON endpoint of the aggregates.
+
+settings.QUERY_BUDGETS maps URL names to the maximum queries of one request,
+a request above budget is logged, or raises QueryBudgetExceeded when
+settings.QUERY_BUDGETS_RAISE is on (as within tests), to catch N+1 queries.
+
+Aggregates are per process, each worker process of the server reports its
+own requests.
+"""
+
+# Python
+import logging
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+# Django
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import JsonResponse
+from django.template.backends.django import DjangoTemplates
+from django.views.decorators.http import require_GET
+
+
+logger = logging.getLogger(__name__)
+
+# Latencies kept per view for the percentiles, the most recent ones.
+LATENCY_SAMPLES = 1000
+
+current_request = ContextVar('current_request', default=None)
+
+
+def percentile(values, percent):
+    """
+    Return the nearest-rank percentile of values, e.g. percent=99 for p99.
+    """
+    if not values:
+        return None
+
+    values = sorted(values)
+    rank = max(int(round(percent / 100 * len(values))) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+    """
+    Measures of the request being served.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+
+class ViewMetrics:
+    """
+    Aggregated measures of every request served by one view.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def add(self, metrics, latency):
+        self.requests += 1
+        self.queries += metrics.queries
+        self.max_queries = max(self.max_queries, metrics.queries)
+        self.db_time += metrics.db_time
+        self.template_time += metrics.template_time
+        self.latencies.append(latency)
+
+    def as_dict(self):
+        def milliseconds(value):
+            return round(value * 1000, 2) if value is not None else None
+
+        latencies = list(self.latencies)
+        return {
+            'requests': self.requests,
+            'p50_ms': milliseconds(percentile(latencies, 50)),
+            'p99_ms': milliseconds(percentile(latencies, 99)),
+            'max_ms': milliseconds(max(latencies, default=None)),
+            'avg_queries': round(self.queries / self.requests, 2),
+            'max_queries': self.max_queries,
+            'avg_db_ms': milliseconds(self.db_time / self.requests),
+            'avg_template_ms': milliseconds(self.template_time / self.requests),
+        }
+
+
+views_metrics = {}
+views_metrics_lock = threading.Lock()
+
+
+def record_request(view_name, metrics, latency):
+    with views_metrics_lock:
+        views_metrics.setdefault(view_name, ViewMetrics()).add(metrics, latency)
+
+
+def get_views_metrics():
+    with views_metrics_lock:
+        return {name: view.as_dict() for name, view in sorted(views_metrics.items())}
+
+
+def reset_views_metrics():
+    with views_metrics_lock:
+        views_metrics.clear()
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - start
+        metrics.queries += 1
+
+
+def install_record_query(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def install_record_query_on_connect(sender, connection, **kwargs):
+    install_record_query(connection)
+
+
+class TimedTemplate:
+    """
+    Wrap a template of the Django backend, timing its render.
+    """
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        metrics = current_request.get()
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            if metrics is not None:
+                metrics.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+class RequestMetricsMiddleware:
+    """
+    Measure every request and add it to the metrics of its view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Connections opened before the middleware was loaded.
+        for connection in connections.all():
+            install_record_query(connection)
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            latency = time.perf_counter() - start
+            current_request.reset(token)
+
+        match = request.resolver_match
+        view_name = match.view_name if match else 'unresolved'
+        record_request(view_name, metrics, latency)
+
+        if latency >= getattr(settings, 'SLOW_REQUEST_SECONDS', 1):
+            logger.warning(
+                'Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms, '
+                'templates %.0f ms.', request.method, request.get_full_path(),
+                view_name, latency * 1000, metrics.queries,
+                metrics.db_time * 1000, metrics.template_time * 1000,
+            )
+
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+        if budget is not None and metrics.queries > budget:
+            message = (
+                f'{request.method} {request.get_full_path()} ({view_name}) '
+                f'executed {metrics.queries} queries, budget is {budget}.'
+            )
+            if getattr(settings, 'QUERY_BUDGETS_RAISE', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        return response
+
+
+@require_GET
+@staff_member_required
+def metrics_view(request):
+    """
+    Return metrics of every view served by this process since it started.
+    """
+    return JsonResponse(get_views_metrics())
@@ -0,0 +1,109 @@
+"""
+Database routing between the primary ('default') database and the read
+replica ('replica'), configured when BLOG_REPLICA_DB environment variable is
+set (refer to settings.py).
+
+Only the views decorated with replica_read read from the replica, everything
+else, and every write, goes to the primary. Rows cached for every client are
+read from the primary within read_primary() even there, a lagging replica
+would otherwise cache again what an invalidation just dropped. After a client writes (any
+non-GET request, or a view decorated with primary_write), ReadYourWritesMiddleware
+pins it to the primary for settings.REPLICA_PIN_SECONDS with a cookie, so the
+client never reads a replica that hasn't caught up with its own write yet.
+"""
+
+# Python
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+# Django
+from django.conf import settings
+
+
+REPLICA = 'replica'
+PIN_COOKIE = 'pin_primary'
+
+reading_replica = ContextVar('reading_replica', default=False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if reading_replica.get() and REPLICA in settings.DATABASES:
+            return REPLICA
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases hold the same rows.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its tables from the primary.
+        return db != REPLICA
+
+
+def replica_read(view):
+    """
+    Read from the replica within view, unless the client is pinned to the
+    primary, only for read-only views.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET' or PIN_COOKIE in request.COOKIES:
+            return view(request, *args, **kwargs)
+
+        token = reading_replica.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            reading_replica.reset(token)
+
+    return wrapper
+
+
+@contextmanager
+def read_primary():
+    """
+    Read from the primary within the block, also within replica_read views.
+    """
+    token = reading_replica.set(False)
+    try:
+        yield
+    finally:
+        reading_replica.reset(token)
+
+
+def primary_write(view):
+    """
+    Mark GET view that writes, so its client gets pinned to the primary.
+    """
+    view.primary_write = True
+    return view
+
+
+class ReadYourWritesMiddleware:
+    """
+    Set the pin cookie on the responses of requests that may have written.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.primary_write = request.method not in ('GET', 'HEAD', 'OPTIONS')
+        response = self.get_response(request)
+
+        if request.primary_write:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax'
+            )
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(view_func, 'primary_write', False):
+            request.primary_write = True
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -57,6 +58,9 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    # Local apps: per-view queries and latency metrics, refer to blog/metrics.py.
+    'blog.metrics.RequestMetricsMiddleware',
+
     # Third party: Django debug toolbar.
     'debug_toolbar.middleware.DebugToolbarMiddleware',
 
@@ -69,6 +73,9 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
+    # Local apps: pin clients to the primary database after they write.
+    'blog.routers.ReadYourWritesMiddleware',
+
     # Third party: Django live reload server.
     'livereload.middleware.LiveReloadScript',
 ]
@@ -77,7 +84,8 @@ ROOT_URLCONF = 'blog.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates timing renders for blog/metrics.py.
+        'BACKEND': 'blog.metrics.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -86,6 +94,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'posts.context_processors.side_widgets',
             ],
         },
     },
@@ -104,6 +113,90 @@ DATABASES = {
     }
 }
 
+# Read replica of the default database (e.g. a copy kept in sync by
+# Litestream or LiteFS), read by the public read-only views, refer to
+# blog/routers.py. Tests read it from the default database.
+if os.environ.get('BLOG_REPLICA_DB'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['BLOG_REPLICA_DB'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['blog.routers.ReplicaRouter']
+
+# Metrics, refer to blog/metrics.py.
+# Requests lasting longer are logged with their queries and render times.
+SLOW_REQUEST_SECONDS = 0.5
+# URL name: maximum queries of one request, whatever the amount of data, a
+# view above budget is logged, or fails the request within tests.
+QUERY_BUDGETS = {
+    'post_list': 8,
+    'post_filter_by_category': 9,
+    'post_search': 7,
+    'post_details': 9,
+    'comment_list': 1,
+    'post_related_to_author': 8,
+    'post_create': 5,
+    'post_update': 7,
+    # Whatever the number of comments, refer to posts/deletion.py.
+    'post_delete': 18,
+    # post_export has none, its rows are read while the response streams,
+    # after the middleware measured it.
+    'comment_create': 5,
+    'notification_list': 6,
+    'notification_mark_read': 5,
+    'notification_details': 3,
+    'latest_posts_rss': 1,
+    'latest_posts_atom': 1,
+    'category_posts_rss': 3,
+    'category_posts_atom': 3,
+    'sitemap_index': 1,
+    'sitemap_categories': 1,
+    # Its rows are read while the response streams, as post_export.
+    'sitemap_posts': 1,
+}
+QUERY_BUDGETS_RAISE = False
+# Turns QUERY_BUDGETS_RAISE on.
+TEST_RUNNER = 'blog.test_runner.TestRunner'
+
+# Seconds a client reads from the primary after writing, longer than the
+# replication lag.
+REPLICA_PIN_SECONDS = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+
+# NOTE: LocMemCache is per process, when running more than one process use a
+# shared backend (e.g. Memcached) so invalidations reach every process.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blog',
+    },
+    # Full pages of anonymous users, refer to posts/page_cache.py.
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pages',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+POSTS_PAGE_CACHE = 'pages'
+
+# Sessions are read from the cache, and written through to the database.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+
+# Authentication
+
+AUTHENTICATION_BACKENDS = [
+    # Local apps: cached session users with their author.
+    'accounts.backends.CachedModelBackend',
+    # Django: sessions opened before CachedModelBackend, until they log in again.
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -150,6 +243,26 @@ MEDIA_ROOT = BASE_DIR / 'media_root'
 
 # During deployment.
 STATIC_ROOT = BASE_DIR / 'static_in_deploy'
+if not DEBUG:
+    # Content-hashed names and precompressed .gz/.br files, written by
+    # collectstatic, refer to blog/storage.py.
+    STATICFILES_STORAGE = 'blog.storage.CompressedManifestStaticFilesStorage'
+
+# Posts: read the rows of streamed responses within a thread, the ORM refuses
+# to run within the event loop, blog/asgi.py sets BLOG_SERVER.
+POSTS_STREAM_IN_THREAD = os.environ.get('BLOG_SERVER') == 'asgi'
+# Posts: serve the public read-only views with async views under ASGI, opt-in
+# with BLOG_ASYNC_VIEWS=1, measured slower than the sync views so far (refer
+# to README.md, Running under ASGI).
+POSTS_ASYNC_VIEWS = POSTS_STREAM_IN_THREAD and os.environ.get('BLOG_ASYNC_VIEWS') == '1'
+# Posts: create comment notifications within a worker thread, in batches.
+POSTS_NOTIFICATION_QUEUE = 'thread'
+# Posts: serve category pages from cached category -> posts lists.
+POSTS_CATEGORY_POSTING_LISTS = True
+# Posts: resize thumbnails within a pool of worker processes.
+POSTS_THUMBNAIL_PIPELINE = 'process'
+# Posts: buffer post views in memory, written in batches by a worker thread.
+POSTS_VIEW_COUNTER = 'buffer'
 
 # Third party: Filebrowser.
 FILEBROWSER_DIRECTORY = ''
@@ -0,0 +1,60 @@
+"""
+Static files storage used by collectstatic on deployment.
+"""
+
+# Python
+import gzip
+
+# Django
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+# Third party: optional, .br files are skipped without it.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Hash file names into staticfiles.json, so the files can be cached forever,
+    then write precompressed .gz and .br siblings of every hashed text file,
+    for the web server to send as they are instead of compressing on each
+    request.
+    """
+    compressible_extensions = ('.css', '.js', '.svg', '.txt', '.json', '.html')
+    # Below that, the compression framing costs more than it saves.
+    minimum_size = 256
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+
+        if dry_run:
+            return
+
+        for name in set(self.hashed_files.values()):
+            if name.endswith(self.compressible_extensions):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as original:
+            content = original.read()
+        if len(content) < self.minimum_size:
+            return
+
+        self.write_sibling(f'{name}.gz', content, gzip.compress(content, compresslevel=9))
+        if brotli is not None:
+            self.write_sibling(f'{name}.br', content, brotli.compress(content))
+
+    def write_sibling(self, name, content, compressed_content):
+        """
+        Write compressed_content as name, unless it's no smaller than content,
+        e.g. already minified and compressed data, the server would send the
+        compressed copy for nothing.
+        """
+        if len(compressed_content) >= len(content):
+            return
+
+        path = self.path(name)
+        with open(path, 'wb') as compressed:
+            compressed.write(compressed_content)
@@ -0,0 +1,42 @@
+# Django
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+# Queries added to settings.QUERY_BUDGETS by use_sync_writes(), post views and
+# notifications are then written within the request.
+SYNC_WRITES_QUERIES = {
+    'post_details': 2,
+    'comment_create': 5,
+}
+
+
+def use_sync_writes():
+    """
+    Write post views and comment notifications right away rather than from
+    worker threads, which test transactions would be hidden from, and which
+    would flush after the test database is gone, into the default database.
+    """
+    settings.QUERY_BUDGETS = {
+        view_name: budget + SYNC_WRITES_QUERIES.get(view_name, 0)
+        for view_name, budget in settings.QUERY_BUDGETS.items()
+    }
+    settings.POSTS_VIEW_COUNTER = 'sync'
+    settings.POSTS_NOTIFICATION_QUEUE = 'sync'
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Test runner failing every request above its settings.QUERY_BUDGETS, refer
+    to blog/metrics.py, with post views and notifications written right away,
+    refer to use_sync_writes.
+
+    The full-page cache is off, so anonymous requests of one test are never
+    answered with the page of another, tests of posts/page_cache.py turn it on.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        use_sync_writes()
+        settings.QUERY_BUDGETS_RAISE = True
+        settings.POSTS_PAGE_CACHE = None
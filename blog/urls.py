@@ -8,6 +8,9 @@ from django.urls import include, path
 import debug_toolbar
 from filebrowser.sites import site
 
+# Local apps
+from blog.metrics import metrics_view
+
 
 urlpatterns = [
     # Local Django.
@@ -17,6 +20,9 @@ urlpatterns = [
     # Django
     path('admin/', admin.site.urls),  # Admin
 
+    # Local apps
+    path('metrics/', metrics_view, name='metrics'),  # Per-view metrics.
+
     # Third party
     path('tinymce/', include('tinymce.urls')),  # TinyMCE
     path('admin/filebrowser/', site.urls),  # FileBrowser
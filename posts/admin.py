@@ -2,11 +2,17 @@
 from django.contrib import admin
 
 # Local apps
+from posts.deletion import delete_posts
 from posts.models import Author, Category, Comment, Post
 
 
 admin.site.register(Author)
-admin.site.register(Category)
+
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ['name', 'slug']
+    prepopulated_fields = {'slug': ('name',)}
 
 
 class CommentInline(admin.StackedInline):
@@ -22,3 +28,9 @@ class PostAdmin(admin.ModelAdmin):
     inlines = [CommentInline]
     list_display = ['title', 'created_time']
     list_filter = ['author']
+
+    def delete_model(self, request, obj):
+        delete_posts(Post.objects.filter(id=obj.id))
+
+    def delete_queryset(self, request, queryset):
+        delete_posts(queryset)
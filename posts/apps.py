@@ -1,5 +1,6 @@
 # Django
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class PostsConfig(AppConfig):
@@ -7,3 +8,5 @@ class PostsConfig(AppConfig):
 
     def ready(self):
         import posts.signals
+
+        post_migrate.connect(posts.signals.setup_search_index, sender=self)
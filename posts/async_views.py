@@ -0,0 +1,62 @@
+"""
+Async versions of the public read-only views, routed by posts/urls.py when
+settings.POSTS_ASYNC_VIEWS is on, opt-in under ASGI with BLOG_ASYNC_VIEWS=1.
+
+Under ASGI, Django runs every sync view within one shared thread, so
+concurrent requests queue behind each other's queries. These views run the
+sync view, its ORM queries and the template rendering (which may query too,
+e.g. user.author) within a thread of the executor pool instead, each with its
+own database connection, so requests run side by side while the event loop
+keeps accepting new ones.
+
+Under WSGI, posts/urls.py keeps the sync views, so do tests: a connection of
+another thread doesn't see the rows of the TestCase transaction.
+"""
+
+# Python
+from functools import wraps
+
+# Django
+from django.db import close_old_connections
+from django.http import HttpResponseNotAllowed
+
+# Third party
+from asgiref.sync import sync_to_async
+
+# Local apps
+from posts import views
+
+
+def run_with_connection(view, request, *args, **kwargs):
+    """
+    Call view within the current worker thread then release the database
+    connection the thread opened, like Django does at the end of a request.
+    """
+    close_old_connections()
+    try:
+        return view(request, *args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def read_only_async(view):
+    """
+    Return async version of the read-only sync view.
+    """
+    run_view = sync_to_async(run_with_connection, thread_sensitive=False)
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        # Checked here as well, Django 3.1 decorators don't support async views.
+        if request.method != 'GET':
+            return HttpResponseNotAllowed(['GET'])
+
+        return await run_view(view, request, *args, **kwargs)
+
+    return async_view
+
+
+post_list = read_only_async(views.post_list)
+post_details = read_only_async(views.post_details)
+post_search = read_only_async(views.post_search)
+post_filter_by_category = read_only_async(views.post_filter_by_category)
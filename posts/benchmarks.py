@@ -0,0 +1,87 @@
+"""
+Module for the helpers shared by the benchmark management commands.
+"""
+
+# Python
+import http.client
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Local apps
+from blog.metrics import percentile
+
+
+def summarize(latencies):
+    """
+    Return count, p50, p99 and max of latencies in milliseconds.
+    """
+    milliseconds = [latency * 1000 for latency in latencies]
+
+    return {
+        'count': len(milliseconds),
+        'p50': percentile(milliseconds, 50),
+        'p99': percentile(milliseconds, 99),
+        'max': max(milliseconds) if milliseconds else None,
+    }
+
+
+def format_summary(summary):
+    if not summary['count']:
+        return 'no requests'
+
+    return (
+        f"{summary['count']} requests, p50 {summary['p50']:.1f} ms, "
+        f"p99 {summary['p99']:.1f} ms, max {summary['max']:.1f} ms"
+    )
+
+
+def load_test(url, concurrency, duration):
+    """
+    Request url from concurrency threads, each one keeping its own HTTP
+    connection open and sending the next request as soon as the previous one
+    is answered, for duration seconds.
+
+    Return (latencies of successful requests in seconds, errors count).
+    """
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path = f'{path}?{parts.query}'
+    connection_class = http.client.HTTPSConnection if parts.scheme == 'https' \
+        else http.client.HTTPConnection
+
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker():
+        connection = connection_class(parts.netloc, timeout=30)
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status < 400
+            except (OSError, http.client.HTTPException):
+                ok = False
+                connection.close()
+                connection = connection_class(parts.netloc, timeout=30)
+            elapsed = time.perf_counter() - start
+
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+        connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return latencies, errors[0]
@@ -0,0 +1,221 @@
+"""
+Module for cached objects used within views and templates.
+
+Entries are invalidated by the receivers within posts/signals.py, the timeout
+only bounds how long a missed invalidation may last, e.g. when the cache is
+per process (LocMemCache) and another process did the write. Missed entries
+are read from the primary database, refer to blog.routers.read_primary.
+"""
+
+# Python
+import hashlib
+import time
+
+# Django
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+# Local apps
+from blog.routers import read_primary
+from posts.models import Category, Post
+
+
+CACHE_TIMEOUT = 60 * 60
+
+CATEGORIES_KEY = 'posts:categories'
+# Fragment name used by {% cache %} within includes/side-widgets.html.
+SIDE_WIDGETS_FRAGMENT = 'side_widgets'
+
+POSTS_GENERATION_KEY = 'posts:generation'
+POST_LIST_HITS_KEY = 'posts:list:hits'
+POST_LIST_MISSES_KEY = 'posts:list:misses'
+CATEGORY_POSTS_KEY = 'posts:category:{}:posts'
+SITEMAP_SHARD_KEY = 'posts:sitemap:{}'
+
+# Post ids per sitemap shard, a shard lists at most 50,000 URLs.
+SITEMAP_SHARD_SIZE = 50000
+
+# Keys per category posting list, a few hundred KB, below the 1 MB item limit
+# of Memcached.
+POSTING_LIST_MAX_KEYS = 5000
+
+
+def get_categories():
+    """
+    Return list of all categories, read from the database only on cache miss.
+
+    Views pass the function itself to the template context, so the list is
+    only fetched if the template really renders it, not when the sidebar
+    fragment is served from cache.
+    """
+    categories = cache.get(CATEGORIES_KEY)
+    if categories is None:
+        with read_primary():
+            categories = list(Category.objects.all())
+        cache.set(CATEGORIES_KEY, categories, CACHE_TIMEOUT)
+
+    return categories
+
+
+def invalidate_categories():
+    cache.delete_many([
+        CATEGORIES_KEY,
+        make_template_fragment_key(SIDE_WIDGETS_FRAGMENT),
+    ])
+
+
+def get_generation(key):
+    """
+    Return the current generation counter stored as key, entries cached under
+    the generation they were computed in are all invalidated at once by
+    bumping it.
+    """
+    generation = cache.get(key)
+    if generation is None:
+        # Start from the current time rather than 1, so a counter that got
+        # evicted never comes back to a generation still used by some entry.
+        cache.add(key, int(time.time() * 1000), None)
+        generation = cache.get(key)
+
+    return generation
+
+
+def bump_generation(key):
+    try:
+        cache.incr(key)
+    # Counter is missing, a fresh one is a new generation already.
+    except ValueError:
+        get_generation(key)
+
+
+def get_posts_generation():
+    """
+    Return the current posts generation, every post list fragment is cached
+    under the generation it was rendered in.
+    """
+    return get_generation(POSTS_GENERATION_KEY)
+
+
+def bump_posts_generation():
+    bump_generation(POSTS_GENERATION_KEY)
+
+
+def increment_counter(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def get_post_list_fragment(name, render_fragment):
+    """
+    Return the post list fragment cached as name within the current posts
+    generation, render_fragment is called to render it on cache miss.
+
+    name identifies the listing and its page, e.g. 'category:python:<cursor>'.
+    """
+    digest = hashlib.md5(name.encode()).hexdigest()
+    key = f'posts:list:{get_posts_generation()}:{digest}'
+
+    fragment = cache.get(key)
+    if fragment is None:
+        increment_counter(POST_LIST_MISSES_KEY)
+        with read_primary():
+            fragment = render_fragment()
+        cache.set(key, fragment, CACHE_TIMEOUT)
+    else:
+        increment_counter(POST_LIST_HITS_KEY)
+
+    return fragment
+
+
+def get_feed(name, render_feed):
+    """
+    Return the feed cached as name within the current posts generation,
+    render_feed is called to render it on cache miss, refer to posts/feeds.py.
+    """
+    key = f'posts:feed:{get_posts_generation()}:{name}'
+
+    feed = cache.get(key)
+    if feed is None:
+        with read_primary():
+            feed = render_feed()
+        cache.set(key, feed, CACHE_TIMEOUT)
+
+    return feed
+
+
+def get_post_list_cache_stats():
+    """
+    Return post list fragment cache hits, misses and hit ratio.
+    """
+    counters = cache.get_many([POST_LIST_HITS_KEY, POST_LIST_MISSES_KEY])
+    hits = counters.get(POST_LIST_HITS_KEY, 0)
+    misses = counters.get(POST_LIST_MISSES_KEY, 0)
+    total = hits + misses
+
+    return {
+        'generation': get_posts_generation(),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else None,
+    }
+
+
+def get_category_post_keys(category_id, ordering):
+    """
+    Return (post_keys, complete), the posting list of category, list of the
+    ordering values of its first POSTING_LIST_MAX_KEYS posts sorted by
+    ordering, e.g. [(created_time, id)], and whether it holds all its posts.
+
+    Built with a single query on cache miss, then post_filter_by_category
+    fetches only the posts of the requested page by id, pages beyond an
+    incomplete list are read from the database.
+    """
+    key = CATEGORY_POSTS_KEY.format(category_id)
+    entry = cache.get(key)
+    if entry is None:
+        fields = [field.lstrip('-') for field in ordering]
+        with read_primary():
+            post_keys = list(
+                Post.objects.filter(categories__id=category_id)
+                .order_by(*ordering).values_list(*fields)[:POSTING_LIST_MAX_KEYS + 1]
+            )
+        entry = (
+            post_keys[:POSTING_LIST_MAX_KEYS],
+            len(post_keys) <= POSTING_LIST_MAX_KEYS,
+        )
+        cache.set(key, entry, CACHE_TIMEOUT)
+
+    return entry
+
+
+def invalidate_category_post_keys(category_ids=None):
+    """
+    Drop the posting lists of category_ids, all categories by default.
+    """
+    if category_ids is None:
+        category_ids = Category.objects.values_list('id', flat=True)
+
+    cache.delete_many([CATEGORY_POSTS_KEY.format(id) for id in category_ids])
+
+
+def get_sitemap_shard_number(post_id):
+    """
+    Return number of the sitemap shard listing post_id, shard 0 lists ids 1
+    to SITEMAP_SHARD_SIZE, shard 1 the next ones, etc.
+    """
+    return (post_id - 1) // SITEMAP_SHARD_SIZE
+
+
+def get_sitemap_shard(number):
+    return cache.get(SITEMAP_SHARD_KEY.format(number))
+
+
+def set_sitemap_shard(number, content):
+    cache.set(SITEMAP_SHARD_KEY.format(number), content, CACHE_TIMEOUT)
+
+
+def invalidate_sitemap_shard(post_id):
+    cache.delete(SITEMAP_SHARD_KEY.format(get_sitemap_shard_number(post_id)))
@@ -0,0 +1,10 @@
+# Local apps
+from posts.cache import CACHE_TIMEOUT
+
+
+def side_widgets(request):
+    """
+    Add the timeout of the {% cache %} fragment of includes/side-widgets.html,
+    kept along with the other entries of posts.cache.
+    """
+    return {'side_widgets_timeout': CACHE_TIMEOUT}
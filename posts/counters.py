@@ -0,0 +1,88 @@
+"""
+Module for the denormalized counters, Post.comment_count and
+Author.unread_notifications.
+
+Counters are changed with single UPDATE statements using F expressions, so
+concurrent requests never overwrite each other's increments, and the recount
+functions rebuild them from the source rows when they drift.
+"""
+
+# Django
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+# Local apps
+from accounts.cache import invalidate_session_users
+from posts.cache import invalidate_sitemap_shard
+from posts.models import Author, Comment, Notification, Post
+
+
+def add_to_comment_count(post_id, delta):
+    """
+    Add delta to the comment count of the post, and bump its updated_time
+    within the same UPDATE since its page changed (refer to posts.conditional).
+
+    updated_time is set from Python, as auto_now does, SQL CURRENT_TIMESTAMP
+    only has second precision on SQLite, so two comments within the same
+    second would leave the same ETag.
+
+    updated_time is also the lastmod of the post within its sitemap shard,
+    dropped once the transaction commits.
+    """
+    Post.objects.filter(pk=post_id).update(
+        comment_count=Greatest(F('comment_count') + delta, 0),
+        updated_time=timezone.now(),
+    )
+    transaction.on_commit(lambda: invalidate_sitemap_shard(post_id))
+
+
+def add_to_unread_notifications(author_filter, delta, user_ids=None):
+    """
+    Add delta to the unread notifications of the authors matching
+    author_filter, e.g. {'post__id': 1} for the author of post 1.
+
+    user_ids, the User ids of these authors when the caller knows them, saves
+    the query reading them to drop their cached session users.
+    """
+    authors = Author.objects.filter(**author_filter)
+    authors.update(
+        unread_notifications=Greatest(F('unread_notifications') + delta, 0)
+    )
+    # The cached session users hold the count, refer to accounts/backends.py.
+    if user_ids is None:
+        user_ids = authors.values_list('name_id', flat=True)
+    invalidate_session_users(user_ids)
+
+
+def recount_comments(posts=None):
+    """
+    Recompute comment_count of posts (all posts by default) in one UPDATE.
+    """
+    if posts is None:
+        posts = Post.objects.all()
+
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by()\
+        .values('post').annotate(total=Count('id')).values('total')
+
+    return posts.update(comment_count=Coalesce(Subquery(comments), 0))
+
+
+def recount_unread_notifications(authors=None):
+    """
+    Recompute unread_notifications of authors (all authors by default) in one
+    UPDATE.
+    """
+    if authors is None:
+        authors = Author.objects.all()
+
+    notifications = Notification.objects\
+        .filter(post__author=OuterRef('pk'), viewed=False).order_by()\
+        .values('post__author').annotate(total=Count('id')).values('total')
+
+    updated = authors.update(
+        unread_notifications=Coalesce(Subquery(notifications), 0)
+    )
+    invalidate_session_users(authors.values_list('name_id', flat=True))
+    return updated
@@ -0,0 +1,111 @@
+"""
+Newline-delimited JSON (NDJSON) export of posts with their categories and
+comments, streamed by post_export view, one post per line:
+
+{"id": 1, "title": "...", "author": "username", "content": "<p>...</p>",
+ "excerpt": "...", "created_time": "2021-02-01T10:00:00.123Z",
+ "updated_time": "...", "categories": [{"id": 1, "name": "Python",
+ "slug": "python"}], "comments": [{"id": 3, "username": "...",
+ "content": "...", "created_time": "..."}]}
+
+Posts are read with a server-side iterator, and categories and comments with
+one query per chunk of posts, so memory stays the same whatever the number of
+posts. A chunk ends early once its posts add up to EXPORT_CHUNK_COMMENTS
+comments (by Post.comment_count), so posts with many comments don't load
+them all at once. The lines of a chunk are sent as one piece.
+"""
+
+# Python
+import json
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# Django
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+
+# Local apps
+from posts.models import Comment, Post
+
+
+EXPORT_CHUNK_SIZE = 500
+EXPORT_CHUNK_COMMENTS = 5000
+
+POST_EXPORT_FIELDS = (
+    'id', 'title', 'author__name__username', 'content', 'excerpt',
+    'created_time', 'updated_time',
+)
+
+
+def export_posts(posts, chunk_size=EXPORT_CHUNK_SIZE, chunk_comments=EXPORT_CHUNK_COMMENTS):
+    """
+    Yield the JSON lines of posts QuerySet, in its order, chunk by chunk of
+    up to chunk_size posts and chunk_comments comments, a post with more
+    comments is a chunk on its own.
+    """
+    chunk = []
+    comments = 0
+    rows = posts.values(*POST_EXPORT_FIELDS, 'comment_count')
+    for post in rows.iterator(chunk_size=chunk_size):
+        comment_count = post.pop('comment_count')
+        if chunk and comments + comment_count > chunk_comments:
+            yield from export_chunk(chunk, posts.db)
+            chunk = []
+            comments = 0
+
+        chunk.append(post)
+        comments += comment_count
+        if len(chunk) == chunk_size:
+            yield from export_chunk(chunk, posts.db)
+            chunk = []
+            comments = 0
+
+    if chunk:
+        yield from export_chunk(chunk, posts.db)
+
+
+def export_chunk(posts, using):
+    ids = [post['id'] for post in posts]
+
+    categories = defaultdict(list)
+    rows = Post.categories.through.objects.using(using).filter(post_id__in=ids)\
+        .values_list('post_id', 'category_id', 'category__name', 'category__slug')
+    for post_id, category_id, name, slug in rows:
+        categories[post_id].append({'id': category_id, 'name': name, 'slug': slug})
+
+    comments = defaultdict(list)
+    rows = Comment.objects.using(using).filter(post_id__in=ids)\
+        .order_by('post_id', 'created_time', 'id')\
+        .values('post_id', 'id', 'username', 'content', 'created_time')
+    for comment in rows.iterator():
+        comments[comment.pop('post_id')].append(comment)
+
+    lines = []
+    for post in posts:
+        post['author'] = post.pop('author__name__username')
+        post['categories'] = categories[post['id']]
+        post['comments'] = comments[post['id']]
+        lines.append(json.dumps(post, cls=DjangoJSONEncoder) + '\n')
+
+    yield ''.join(lines)
+
+
+def iterate_in_thread(iterator):
+    """
+    Yield the items of iterator, each one computed within the same dedicated
+    thread.
+
+    Under ASGI, Django 3.1 iterates streaming content within the event loop,
+    where the ORM refuses to run. The loop still waits for each chunk, so
+    keep chunks small enough.
+    """
+    done = object()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        try:
+            while True:
+                item = executor.submit(next, iterator, done).result()
+                if item is done:
+                    break
+                yield item
+        finally:
+            executor.submit(connections.close_all)
@@ -2,6 +2,10 @@
 NOTE: The passed argument -- first_name --  is related to the faker
 library and not to Django or the Local apps, more examples here:
 https://faker.readthedocs.io/en/master/providers/faker.providers.person.html
+
+Related objects are created by SubFactory when they're not passed, so every
+factory works on an empty database. To fill the database with many rows at
+once, use seed_blog command instead, it inserts them in bulk.
 """
 
 
@@ -13,7 +17,31 @@ from factory.django import DjangoModelFactory
 from django.contrib.auth.models import User
 
 # Local apps
-from posts.models import Author, Comment, Notification, Post
+from posts.models import Author, Category, Comment, Notification, Post
+
+
+class UserFactory(DjangoModelFactory):
+    class Meta:
+        model = User
+        django_get_or_create = ('username',)
+
+    username = factory.Sequence(lambda n: f'user{n}')
+    password = factory.PostGenerationMethodCall('set_password', 'password')
+
+
+class AuthorFactory(DjangoModelFactory):
+    class Meta:
+        model = Author
+
+    name = factory.SubFactory(UserFactory)
+
+
+class CategoryFactory(DjangoModelFactory):
+    class Meta:
+        model = Category
+        django_get_or_create = ('name',)
+
+    name = factory.Sequence(lambda n: f'Category {n}')
 
 
 class PostFactory(DjangoModelFactory):
@@ -27,17 +55,15 @@ class PostFactory(DjangoModelFactory):
     class Meta:
         model = Post
 
-    # Assuming that Author is exist, or you have to create one.
-    author = Author.objects.get(pk=1)
+    author = factory.SubFactory(AuthorFactory)
 
     title = factory.Faker('first_name')
-    thumbnail = 'pexels-mike-170811.jpg'
-    content = factory.Faker('sentence', nb_words=5, variable_nb_words=True)
+    content = factory.Faker('paragraph', nb_sentences=5)
 
 
 class CommentFactory(DjangoModelFactory):
     """
-    Create post objects with dummy data for testing.
+    Create comment objects with dummy data for testing.
 
     Usage, open Django shell and
         for i in range(10):
@@ -46,16 +72,16 @@ class CommentFactory(DjangoModelFactory):
     class Meta:
         model = Comment
 
-    # Assuming that Post and User are exist, or you have to create one.
-    post = Post.objects.get(id=2)
-    commenter = User.objects.get(pk=1)
+    post = factory.SubFactory(PostFactory)
+    username = factory.Faker('user_name')
 
     content = factory.Faker('sentence', nb_words=5, variable_nb_words=True)
 
 
 class NotificationFactory(DjangoModelFactory):
     """
-    Create notification objects with dummy data for testing.
+    Create notification objects with dummy data for testing, saving a
+    comment already creates its notification (refer to posts/signals.py).
 
     Usage, open Django shell and
         for i in range(10):
@@ -64,8 +90,5 @@ class NotificationFactory(DjangoModelFactory):
     class Meta:
         model = Notification
 
-    # Assuming that User is exist, or you have to create one.
-    receiver = User.objects.get(pk=1)
-
-    feedback_to_user = factory.Faker('sentence', nb_words=5, variable_nb_words=True)
-    sender_model_id = factory.Faker('sentence', nb_words=5, variable_nb_words=True)
+    post = factory.SubFactory(PostFactory)
+    comment_id = factory.Sequence(lambda n: f'factory-{n}')
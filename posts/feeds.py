@@ -0,0 +1,144 @@
+"""
+RSS and Atom feeds of the newest posts, site-wide and per category.
+
+The XML of each feed is cached within the current posts generation, which the
+Post and Category receivers of posts/signals.py bump, so it's rendered once per
+change however many clients poll it. Clients sending back the ETag or the
+Last-Modified of their copy get a 304 from the cache alone.
+"""
+
+# Python
+import hashlib
+
+# Django
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.http import Http404, HttpResponse
+from django.shortcuts import reverse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.http import parse_http_date_safe
+from django.views.decorators.http import require_GET
+
+# Local apps
+from blog.routers import replica_read
+from posts.cache import get_categories, get_category_post_keys, get_feed
+from posts.models import Post
+
+
+FEED_ITEMS = 20
+
+# Same order as the post lists, refer to posts/views.py.
+FEED_ORDERING = ('-created_time', '-id')
+
+FEED_FIELDS = (
+    'id', 'title', 'excerpt', 'created_time', 'updated_time',
+    'author__name__username',
+)
+
+
+class LatestPostsFeed(Feed):
+    title = 'Simple Blog'
+    description = 'Newest posts of Simple Blog.'
+
+    def link(self):
+        return reverse('post_list')
+
+    def items(self):
+        return Post.objects.select_related('author__name')\
+            .only(*FEED_FIELDS).order_by(*FEED_ORDERING)[:FEED_ITEMS]
+
+    def item_title(self, item):
+        return item.title
+
+    def item_description(self, item):
+        return item.excerpt
+
+    def item_pubdate(self, item):
+        return item.created_time
+
+    def item_updateddate(self, item):
+        return item.updated_time
+
+    def item_author_name(self, item):
+        return item.author.name.username if item.author else None
+
+
+class LatestPostsAtomFeed(LatestPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = LatestPostsFeed.description
+
+
+class CategoryPostsFeed(LatestPostsFeed):
+    def get_object(self, request, category):
+        for item in get_categories():
+            if item.slug == category:
+                return item
+        raise Http404('No category matches the given query.')
+
+    def title(self, obj):
+        return f'Simple Blog: {obj.name} posts'
+
+    def description(self, obj):
+        return f'Newest {obj.name} posts of Simple Blog.'
+
+    def link(self, obj):
+        return obj.get_absolute_url()
+
+    def items(self, obj):
+        posts = Post.objects.select_related('author__name').only(*FEED_FIELDS)
+
+        if getattr(settings, 'POSTS_CATEGORY_POSTING_LISTS', False):
+            keys, _ = get_category_post_keys(obj.id, FEED_ORDERING)
+            keys = keys[:FEED_ITEMS]
+            rows = posts.in_bulk([key[-1] for key in keys])
+            return [rows[key[-1]] for key in keys if key[-1] in rows]
+
+        return posts.filter(categories=obj).order_by(*FEED_ORDERING)[:FEED_ITEMS]
+
+
+class CategoryPostsAtomFeed(CategoryPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = CategoryPostsFeed.description
+
+
+def cached_feed(feed_class):
+    """
+    Return view serving feed_class from the feeds cache, with conditional GET.
+    """
+    feed = feed_class()
+
+    def render_feed(request, **kwargs):
+        response = feed(request, **kwargs)
+        return {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'last_modified': response.get('Last-Modified'),
+            'etag': quote_etag(hashlib.md5(response.content).hexdigest()),
+        }
+
+    @require_GET
+    @replica_read
+    def view(request, **kwargs):
+        name = ':'.join([feed_class.__name__, *kwargs.values()])
+        entry = get_feed(name, lambda: render_feed(request, **kwargs))
+
+        response = get_conditional_response(
+            request, etag=entry['etag'],
+            last_modified=parse_http_date_safe(entry['last_modified'] or ''),
+        )
+        if response is None:
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+
+        response['ETag'] = entry['etag']
+        if entry['last_modified']:
+            response['Last-Modified'] = entry['last_modified']
+        return response
+
+    return view
+
+
+latest_posts_rss = cached_feed(LatestPostsFeed)
+latest_posts_atom = cached_feed(LatestPostsAtomFeed)
+category_posts_rss = cached_feed(CategoryPostsFeed)
+category_posts_atom = cached_feed(CategoryPostsAtomFeed)
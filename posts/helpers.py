@@ -2,8 +2,18 @@
 Module for repeated objects used within views.
 """
 
+# Python
+import binascii
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
 # Django
+from django.core.exceptions import ValidationError
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Q
+
+# Third party
+from bs4 import BeautifulSoup
 
 
 def pagination(request, queryset, objects_per_page):
@@ -26,3 +36,253 @@ def pagination(request, queryset, objects_per_page):
         paginated_queryset = paginator.page(paginator.num_pages)
 
     return paginated_queryset
+
+
+class KeysetPage:
+    """
+    Page returned by keyset_pagination, quacks like Django Page for what the
+    templates use (iteration, has_next, has_previous) but points to the
+    neighbour pages with opaque cursors instead of page numbers.
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def encode_cursor(values, direction='next', inclusive=False):
+    """
+    Return opaque URL-safe token holding the ordering values of a row, the
+    direction to walk from it and whether the row itself belongs to the page.
+    """
+    payload = [direction, [str(value) for value in values], inclusive]
+    return urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(token, model, ordering):
+    """
+    Return (direction, values, inclusive) of a token made by encode_cursor,
+    values are converted back to the Python type of their model field.
+
+    Return None on a missing, tampered or out of date token.
+    """
+    if not token:
+        return None
+
+    try:
+        direction, values, inclusive = json.loads(urlsafe_b64decode(token))
+        if direction not in ('next', 'previous') or len(values) != len(ordering):
+            return None
+
+        values = [
+            model._meta.get_field(field.lstrip('-')).to_python(value)
+            for field, value in zip(ordering, values)
+        ]
+    except (binascii.Error, TypeError, ValueError, ValidationError):
+        return None
+
+    return direction, values, bool(inclusive)
+
+
+def keyset_filter(ordering, values, inclusive=False):
+    """
+    Return Q object selecting the rows that come after values within ordering.
+
+    - ordering = ('-created_time', '-id')
+    - values = (t, 5)
+    - keyset_filter returns
+      created_time <= t AND (created_time < t OR (created_time = t AND id < 5))
+    """
+    fields = [field.lstrip('-') for field in ordering]
+    lookups = ['lt' if field.startswith('-') else 'gt' for field in ordering]
+
+    condition = Q()
+    for i, field in enumerate(fields):
+        lookup = lookups[i]
+        if inclusive and i == len(fields) - 1:
+            lookup += 'e'
+        term = Q(**{f'{field}__{lookup}': values[i]})
+        for previous_field, previous_value in zip(fields[:i], values[:i]):
+            term &= Q(**{previous_field: previous_value})
+        condition |= term
+
+    # A plain range on the leading column lets the database use its index,
+    # the OR chain above only breaks ties within that range.
+    leading = Q(**{f'{fields[0]}__{lookups[0]}e': values[0]})
+    return leading & condition
+
+
+def keyset_pagination(request, queryset, objects_per_page, ordering, cursor=None):
+    """
+    Return KeysetPage of queryset ordered by the ordering fields, which must
+    end with a unique field (typically id) so every row has a distinct key.
+
+    Unlike pagination, pages are fetched with an indexed range read instead of
+    COUNT and OFFSET, so the cost of a page doesn't grow with its depth, but
+    there is no page count or page numbers.
+
+    Workd only within a function view or class based view method with request
+    argument passed to it, the cursor is read from request.GET['cursor']
+    unless passed with the cursor argument.
+    """
+    if cursor is None:
+        cursor = request.GET.get('cursor')
+    cursor = decode_cursor(cursor, queryset.model, ordering)
+    direction, values, inclusive = cursor or ('next', None, False)
+
+    walk = ordering
+    if direction == 'previous':
+        walk = [
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in ordering
+        ]
+
+    rows = queryset.order_by(*walk)
+    if values is not None:
+        rows = rows.filter(keyset_filter(walk, values, inclusive))
+
+    # Fetch one extra row to tell whether there is a page beyond this one.
+    rows = list(rows[:objects_per_page + 1])
+    has_more = len(rows) > objects_per_page
+    rows = rows[:objects_per_page]
+
+    if direction == 'previous':
+        # Walked backward past the first page, show the first page in full.
+        if not has_more:
+            return keyset_pagination_first_page(queryset, objects_per_page, ordering)
+        rows.reverse()
+        has_next, has_previous = True, True
+    else:
+        has_next, has_previous = has_more, values is not None
+
+    def row_values(row):
+        return [getattr(row, field.lstrip('-')) for field in ordering]
+
+    next_cursor = previous_cursor = None
+    if rows:
+        if has_next:
+            next_cursor = encode_cursor(row_values(rows[-1]), 'next')
+        if has_previous:
+            previous_cursor = encode_cursor(row_values(rows[0]), 'previous')
+    elif has_previous:
+        previous_cursor = encode_cursor(values, 'previous', not inclusive)
+
+    return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+def keyset_pagination_of_keys(request, keys, objects_per_page, queryset, ordering,
+                              complete=True):
+    """
+    Return KeysetPage like keyset_pagination, but walk keys, a precomputed
+    list of the ordering values of every row sorted by ordering (e.g. a cached
+    posting list), and fetch only the rows of the page by their id, the last
+    ordering field.
+
+    When keys only hold the first rows (complete is False), return None for
+    the pages reaching beyond them, to be read with keyset_pagination.
+
+    Cursors are interchangeable with the ones of keyset_pagination.
+    """
+    cursor = decode_cursor(request.GET.get('cursor'), queryset.model, ordering)
+    direction, values, inclusive = cursor or ('next', None, False)
+
+    start = 0
+    if values is not None:
+        values = tuple(values)
+        # Binary search for the first key not coming before values.
+        low, high = 0, len(keys)
+        while low < high:
+            middle = (low + high) // 2
+            if key_comes_before(keys[middle], values, ordering):
+                low = middle + 1
+            else:
+                high = middle
+        found = low < len(keys) and tuple(keys[low]) == values
+
+        if direction == 'next':
+            start = low + 1 if found and not inclusive else low
+        else:
+            end = low + 1 if found and inclusive else low
+            start = max(end - objects_per_page, 0)
+
+    # The next page key must be known too, to tell whether there is one.
+    if not complete and start + objects_per_page >= len(keys):
+        return None
+
+    page_keys = keys[start:start + objects_per_page]
+    rows = queryset.in_bulk([key[-1] for key in page_keys])
+    # Rows deleted since keys were computed are skipped.
+    object_list = [rows[key[-1]] for key in page_keys if key[-1] in rows]
+
+    next_cursor = previous_cursor = None
+    if page_keys and start + objects_per_page < len(keys):
+        next_cursor = encode_cursor(page_keys[-1], 'next')
+    if page_keys and start > 0:
+        previous_cursor = encode_cursor(page_keys[0], 'previous')
+
+    return KeysetPage(object_list, next_cursor, previous_cursor)
+
+
+def key_comes_before(key, other, ordering):
+    """
+    Return True if a row with key values comes before a row with other
+    values within ordering.
+    """
+    for field, value, other_value in zip(ordering, key, other):
+        if value != other_value:
+            if field.startswith('-'):
+                return value > other_value
+            return value < other_value
+
+    return False
+
+
+def keyset_cursor_at(obj, ordering):
+    """
+    Return cursor of the page starting with obj.
+    """
+    values = [getattr(obj, field.lstrip('-')) for field in ordering]
+    return encode_cursor(values, 'next', inclusive=True)
+
+
+def keyset_pagination_first_page(queryset, objects_per_page, ordering):
+    """
+    Return the first KeysetPage of queryset.
+    """
+    rows = list(queryset.order_by(*ordering)[:objects_per_page + 1])
+    next_cursor = None
+    if len(rows) > objects_per_page:
+        rows = rows[:objects_per_page]
+        next_cursor = encode_cursor(
+            [getattr(rows[-1], field.lstrip('-')) for field in ordering], 'next'
+        )
+
+    return KeysetPage(rows, next_cursor)
+
+
+def html_to_text(html):
+    """
+    Return the visible text of the HTML generated by TinyMCE, with tags
+    removed and whitespace collapsed.
+    """
+    if not html:
+        return ''
+
+    return BeautifulSoup(html, 'html.parser').get_text(' ', strip=True)
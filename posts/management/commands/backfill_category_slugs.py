@@ -0,0 +1,18 @@
+# Django
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+# Local apps
+from posts.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Give a unique slug to every category without one.'
+
+    def handle(self, *args, **options):
+        updated = 0
+        for category in Category.objects.filter(Q(slug__isnull=True) | Q(slug='')).order_by('id'):
+            category.save(update_fields=['slug'])
+            updated += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} categories.'))
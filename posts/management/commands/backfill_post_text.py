@@ -0,0 +1,40 @@
+# Django
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+# Local apps
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Compute Post.plain_text and Post.excerpt from the content of every post.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of posts updated within a single transaction.'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # Walk the table by primary key, so each batch is an indexed range
+        # read no matter how deep into the table it is.
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(
+                Post.objects.filter(id__gt=last_id).order_by('id')
+                .only('id', 'content')[:batch_size]
+            )
+            if not batch:
+                break
+
+            for post in batch:
+                post.set_text_fields()
+            with transaction.atomic():
+                Post.objects.bulk_update(batch, ['plain_text', 'excerpt'])
+            updated += len(batch)
+            last_id = batch[-1].id
+
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} posts.'))
@@ -0,0 +1,41 @@
+# Django
+from django.core.management.base import BaseCommand
+
+# Local apps
+from posts.benchmarks import format_summary, load_test, summarize
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test a running server at increasing concurrency levels, run it '
+        'once against the WSGI server and once against the ASGI server to '
+        'compare them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'urls', nargs='+',
+            help='URLs to request, e.g. http://127.0.0.1:8000/post/1/'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, nargs='+', default=[1, 10, 50, 100],
+            help='Concurrent clients of each run.'
+        )
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Seconds each run lasts.'
+        )
+
+    def handle(self, *args, **options):
+        duration = options['duration']
+
+        for url in options['urls']:
+            self.stdout.write(self.style.MIGRATE_HEADING(url))
+            for concurrency in options['concurrency']:
+                latencies, errors = load_test(url, concurrency, duration)
+                summary = summarize(latencies)
+                self.stdout.write(
+                    f'  {concurrency:>4} clients: '
+                    f'{summary["count"] / duration:8.1f} req/s, '
+                    f'{format_summary(summary)}, {errors} errors'
+                )
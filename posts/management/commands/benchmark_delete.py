@@ -0,0 +1,108 @@
+# Python
+import time
+
+# Django
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import (setup_databases, setup_test_environment,
+                               teardown_databases, teardown_test_environment)
+
+# Local apps
+from blog.metrics import percentile
+from blog.test_runner import use_sync_writes
+from posts.deletion import delete_posts
+from posts.factories import AuthorFactory, CategoryFactory
+from posts.models import Author, Comment, Notification, Post
+
+
+class QueryCounter:
+    """
+    Execute wrapper counting queries, CaptureQueriesContext only keeps the
+    last 9000 ones.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark deleting a post with --comments comments and their '
+        'notifications within a throwaway test database, with post.delete() '
+        'and with posts.deletion.delete_posts, reporting time and queries.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--comments', type=int, nargs='+', default=[100, 1000, 10000],
+            help='Comments of the deleted post.'
+        )
+        parser.add_argument(
+            '--runs', type=int, default=3,
+            help='Deletions per method and size, the median is reported.'
+        )
+
+    def handle(self, *args, **options):
+        # Without DEBUG, so neither the debug toolbar nor query logging run.
+        setup_test_environment(debug=False)
+        use_sync_writes()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            author = AuthorFactory()
+            categories = CategoryFactory.create_batch(3)
+
+            methods = {
+                'post.delete()': lambda post: post.delete(),
+                'delete_posts': lambda post: delete_posts(Post.objects.filter(id=post.id)),
+            }
+            for comments in options['comments']:
+                self.stdout.write(self.style.MIGRATE_HEADING(f'{comments} comments'))
+                for name, delete in methods.items():
+                    latencies = []
+                    queries = []
+                    for _ in range(options['runs']):
+                        post = self.create_post(author, categories, comments)
+
+                        counter = QueryCounter()
+                        with connection.execute_wrapper(counter):
+                            start = time.perf_counter()
+                            delete(post)
+                            latencies.append(time.perf_counter() - start)
+                        queries.append(counter.count)
+
+                    self.stdout.write(
+                        f'  {name:<15} {percentile(latencies, 50) * 1000:.1f} ms, '
+                        f'{percentile(queries, 50)} queries'
+                    )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    def create_post(self, author, categories, comments):
+        """
+        Create a post with comments, each one with its notification, half of
+        them unread, without going through the signals.
+        """
+        post = Post.objects.create(
+            author=author, title='Deleted', content='<p>Deleted</p>',
+            comment_count=comments,
+        )
+        post.categories.set(categories)
+
+        Comment.objects.bulk_create(
+            [Comment(post=post, username='reader', content='Comment')
+             for _ in range(comments)],
+            batch_size=1000,
+        )
+        comment_ids = Comment.objects.filter(post=post).values_list('id', flat=True)
+        Notification.objects.bulk_create(
+            [Notification(post=post, comment_id=str(comment_id), viewed=index % 2 == 0)
+             for index, comment_id in enumerate(comment_ids)],
+            batch_size=1000,
+        )
+        Author.objects.filter(id=author.id).update(unread_notifications=comments // 2)
+        return post
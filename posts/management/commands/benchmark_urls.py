@@ -0,0 +1,191 @@
+# Python
+import io
+import os
+import random
+import tempfile
+import time
+
+# Django
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.shortcuts import reverse
+from django.test import Client
+from django.test.utils import (CaptureQueriesContext, setup_databases,
+                               setup_test_environment, teardown_databases,
+                               teardown_test_environment)
+
+# Local apps
+from blog.metrics import percentile
+from blog.test_runner import use_sync_writes
+from posts import urls
+from posts.benchmarks import format_summary, summarize
+from posts.cache import SITEMAP_SHARD_SIZE
+from posts.models import Author, Category, Notification, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every URL of posts/urls.py within a throwaway test '
+        'database seeded with seed_blog at each --posts size, reporting '
+        'p50/p99 latency and queries per request.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts', type=int, nargs='+', default=[1000, 100000, 1000000],
+            help='Database sizes, in posts, seeded one after the other.'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Requests per URL at each size.'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Clear the cache before every request, to measure the '
+                 'database rather than the cached fragments.'
+        )
+        parser.add_argument(
+            '--database', default=os.path.join(tempfile.gettempdir(), 'blog_benchmark.sqlite3'),
+            help='File of the test database, SQLite test databases are '
+                 'in-memory by default, too small for a million posts.'
+        )
+
+    def handle(self, *args, **options):
+        sizes = sorted(options['posts'])
+        self.random = random.Random(0)
+
+        connection.settings_dict['TEST']['NAME'] = options['database']
+        # Without DEBUG, so neither the debug toolbar nor query logging run.
+        setup_test_environment(debug=False)
+        use_sync_writes()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            seeded = 0
+            for size in sizes:
+                self.stdout.write(f'Seeding {size} posts...')
+                call_command(
+                    'seed_blog', posts=size - seeded, authors=0 if seeded else 10,
+                    categories=0 if seeded else 10, stdout=io.StringIO()
+                )
+                seeded = size
+
+                self.stdout.write(self.style.MIGRATE_HEADING(f'{size} posts'))
+                self.benchmark(options['requests'], options['cold'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    def benchmark(self, requests, cold):
+        client = Client()
+        author = Author.objects.select_related('name').order_by('id').first()
+        author.name.is_staff = True
+        author.name.save()
+        client.force_login(author.name)
+
+        builders = self.request_builders(author)
+        for pattern in urls.urlpatterns:
+            build = builders.get(pattern.name)
+            if build is None:
+                raise CommandError(f'No benchmark request for {pattern.name} URL.')
+
+            cache.clear()
+            latencies = []
+            queries = []
+            for _ in range(requests):
+                if cold:
+                    cache.clear()
+                method, url, data = build()
+
+                with CaptureQueriesContext(connection) as context:
+                    start = time.perf_counter()
+                    response = getattr(client, method)(url, data)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    latencies.append(time.perf_counter() - start)
+                queries.append(len(context.captured_queries))
+
+                if response.status_code >= 400:
+                    raise CommandError(f'{method.upper()} {url} answered {response.status_code}.')
+
+            self.stdout.write(
+                f'  {pattern.name:<25} {format_summary(summarize(latencies))}, '
+                f'queries p50 {percentile(queries, 50)} max {max(queries)}'
+            )
+
+    def request_builders(self, author):
+        """
+        Return URL name: function returning (method, url, data) of a request,
+        spread over random posts, so the benchmark doesn't measure one hot row.
+        """
+        last_post = Post.objects.order_by('-id').values_list('id', flat=True).first()
+        slugs = list(Category.objects.values_list('slug', flat=True))
+        words = Post.objects.filter(id=last_post).values_list('title', flat=True)[0].split()
+        # Export of the newest 100 posts, like an incremental pull.
+        since = list(
+            Post.objects.order_by('-created_time')
+            .values_list('created_time', flat=True)[:100]
+        )[-1]
+        notifications = list(
+            Notification.objects.filter(post__author=author)
+            .values_list('id', flat=True)[:1000]
+        )
+
+        def random_post():
+            # Ids of deleted posts are skipped.
+            return Post.objects.filter(id__gte=self.random.randint(1, last_post))\
+                .order_by('id').values_list('id', flat=True).first()
+
+        def get(name, data=None, **kwargs):
+            return 'get', reverse(name, kwargs=kwargs), data or {}
+
+        def post_delete():
+            # Created outside of the measured request.
+            post = Post.objects.create(author=author, title='Deleted', content='<p>Deleted</p>')
+            return get('post_delete', id=post.id)
+
+        return {
+            'post_list': lambda: get('post_list'),
+            'post_related_to_author': lambda: get('post_related_to_author'),
+            'post_create': lambda: get('post_create'),
+            'post_list_cache_stats': lambda: get('post_list_cache_stats'),
+            'post_export': lambda: get(
+                'post_export', {'since': since.isoformat()}
+            ),
+            'post_search': lambda: get(
+                'post_search', {'query': self.random.choice(words)}
+            ),
+            'post_delete': post_delete,
+            'post_update': lambda: get('post_update', id=random_post()),
+            'comment_create': lambda: (
+                'post', reverse('comment_create', kwargs={'id': random_post()}),
+                {'content': 'Benchmark comment'}
+            ),
+            'comment_list': lambda: get('comment_list', id=random_post()),
+            'post_details': lambda: get('post_details', id=random_post()),
+            'post_filter_by_category': lambda: get(
+                'post_filter_by_category', category=self.random.choice(slugs)
+            ),
+            'latest_posts_rss': lambda: get('latest_posts_rss'),
+            'latest_posts_atom': lambda: get('latest_posts_atom'),
+            'category_posts_rss': lambda: get(
+                'category_posts_rss', category=self.random.choice(slugs)
+            ),
+            'category_posts_atom': lambda: get(
+                'category_posts_atom', category=self.random.choice(slugs)
+            ),
+            'sitemap_index': lambda: get('sitemap_index'),
+            'sitemap_categories': lambda: get('sitemap_categories'),
+            'sitemap_posts': lambda: get(
+                'sitemap_posts', number=self.random.randint(0, (last_post - 1) // SITEMAP_SHARD_SIZE)
+            ),
+            'notification_list': lambda: get('notification_list'),
+            'notification_mark_read': lambda: (
+                'post', reverse('notification_mark_read'),
+                {'ids': self.random.sample(notifications, min(len(notifications), 20))}
+            ),
+            'notification_details': lambda: get(
+                'notification_details', id=self.random.choice(notifications)
+            ),
+        }
@@ -0,0 +1,49 @@
+# Python
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Local apps
+from posts.models import Post
+from posts.thumbnails import generate_derivatives, invalidate_derivatives
+
+
+class Command(BaseCommand):
+    help = 'Generate the resized derivatives of every post thumbnail.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Number of worker processes, defaults to the number of CPUs.'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Regenerate derivatives that are already up to date.'
+        )
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(thumbnail__isnull=True).exclude(thumbnail='')\
+            .order_by().values_list('thumbnail', flat=True).distinct()
+        media_root = str(settings.MEDIA_ROOT)
+
+        written = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {
+                executor.submit(
+                    generate_derivatives, str(name), media_root, options['force']
+                ): name
+                for name in names.iterator()
+            }
+            for future in as_completed(futures):
+                try:
+                    written += future.result()
+                except OSError as error:
+                    failed += 1
+                    self.stderr.write(f'{futures[future]}: {error}')
+                invalidate_derivatives(str(futures[future]))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} derivatives, {failed} thumbnails failed.'
+        ))
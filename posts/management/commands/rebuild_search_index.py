@@ -0,0 +1,44 @@
+# Django
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+# Local apps
+from posts.models import Post
+from posts.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Drop and rebuild the posts full-text search index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of posts indexed within a single transaction.'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        backend = get_search_backend()
+        backend.setup()
+
+        with transaction.atomic():
+            backend.clear()
+
+        # Walk the table by primary key, so each batch is an indexed range
+        # read no matter how deep into the table it is.
+        indexed = 0
+        last_id = 0
+        while True:
+            batch = list(
+                Post.objects.filter(id__gt=last_id).order_by('id')
+                .only('id', 'title', 'plain_text')[:batch_size]
+            )
+            if not batch:
+                break
+
+            with transaction.atomic():
+                backend.index(batch)
+            indexed += len(batch)
+            last_id = batch[-1].id
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} posts.'))
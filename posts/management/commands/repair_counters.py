@@ -0,0 +1,23 @@
+# Django
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+# Local apps
+from posts.counters import recount_comments, recount_unread_notifications
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute Post.comment_count and Author.unread_notifications from '
+        'the comment and notification rows.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            posts = recount_comments()
+            authors = recount_unread_notifications()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Recounted comments of {posts} posts and unread notifications '
+            f'of {authors} authors.'
+        ))
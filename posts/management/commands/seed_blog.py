@@ -0,0 +1,188 @@
+# Python
+import random
+
+# Django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.text import Truncator
+
+# Third party
+from faker import Faker
+
+# Local apps
+from posts.cache import (bump_posts_generation, invalidate_categories,
+                         invalidate_category_post_keys)
+from posts.counters import recount_unread_notifications
+from posts.models import (EXCERPT_LENGTH, Author, Category, Comment,
+                          Notification, Post)
+from posts.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with dummy authors, categories, posts, comments '
+        'and notifications, inserted in bulk within one transaction per batch '
+        'of posts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=10)
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument(
+            '--comments', type=int, default=3,
+            help='Average number of comments per post, each one notified.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Number of posts, with their related rows, per transaction.'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=None,
+            help='Seed of the random data, to seed the same data again.'
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        fake = Faker()
+        fake.seed_instance(options['seed'])
+        # Sentences are built from a fixed vocabulary rather than Faker calls
+        # per row, which would make large runs last hours.
+        self.words = fake.words(nb=1000)
+
+        authors = self.create_authors(options['authors'])
+        categories = self.create_categories(options['categories'])
+        if not authors or not categories:
+            raise CommandError('Posts need at least one author and one category.')
+
+        created_posts = created_comments = 0
+        while created_posts < options['posts']:
+            size = min(options['batch_size'], options['posts'] - created_posts)
+            with transaction.atomic():
+                created_comments += self.create_posts(
+                    size, authors, categories, options['comments']
+                )
+            created_posts += size
+            self.stdout.write(f'{created_posts} posts...', ending='\r')
+
+        recount_unread_notifications()
+
+        # Signals don't fire on bulk_create, drop what the running process
+        # may have cached (only this process for a per-process cache).
+        invalidate_categories()
+        invalidate_category_post_keys()
+        bump_posts_generation()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created_posts} posts and {created_comments} comments '
+            f'with their notifications, among {len(authors)} authors and '
+            f'{len(categories)} categories.'
+        ))
+
+    def sentence(self, words):
+        return ' '.join(self.random.choices(self.words, k=words)).capitalize() + '.'
+
+    def create_authors(self, count):
+        """
+        Create count authors, all with the password 'password', return ids of
+        every author.
+        """
+        start = (User.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        password = make_password('password')
+
+        with transaction.atomic():
+            User.objects.bulk_create(
+                User(username=f'seed{number}', password=password)
+                for number in range(start, start + count)
+            )
+            users = User.objects.filter(
+                username__in=[f'seed{number}' for number in range(start, start + count)]
+            )
+            Author.objects.bulk_create(Author(name=user) for user in users)
+
+        return list(Author.objects.values_list('id', flat=True))
+
+    def create_categories(self, count):
+        """
+        Return ids of the existing categories and count new ones.
+
+        bulk_create skips save(), so slugs are set here, unique among the
+        existing ones, names are reused once a category was deleted.
+        """
+        start = Category.objects.count() + 1
+        categories = []
+        for number in range(start, start + count):
+            category = Category(name=f'Category {number}')
+            category.slug = category.unique_slug()
+            categories.append(category)
+
+        Category.objects.bulk_create(categories)
+        return list(Category.objects.values_list('id', flat=True))
+
+    def create_posts(self, count, authors, categories, average_comments):
+        """
+        Insert count posts with their categories, comments, notifications
+        and search index entries, return the number of comments.
+        """
+        posts = []
+        comments_per_post = []
+        for _ in range(count):
+            plain_text = ' '.join(
+                self.sentence(self.random.randint(8, 20)) for _ in range(5)
+            )
+            comments = self.random.randint(0, average_comments * 2)
+            comments_per_post.append(comments)
+            posts.append(Post(
+                author_id=self.random.choice(authors),
+                title=Truncator(self.sentence(4)).chars(50),
+                content=f'<p>{plain_text}</p>',
+                plain_text=plain_text,
+                excerpt=Truncator(plain_text).chars(EXCERPT_LENGTH),
+                comment_count=comments,
+            ))
+
+        # SQLite doesn't return the ids of bulk inserted rows, read them back
+        # as the ids above the previous maximum.
+        last_id = Post.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        Post.objects.bulk_create(posts)
+        posts = list(
+            Post.objects.filter(id__gt=last_id).order_by('id')
+            .only('id', 'title', 'plain_text')
+        )
+
+        Through = Post.categories.through
+        Through.objects.bulk_create(
+            Through(post_id=post.id, category_id=category)
+            for post in posts
+            for category in self.random.sample(
+                categories, min(len(categories), self.random.randint(1, 3))
+            )
+        )
+
+        last_comment_id = Comment.objects.order_by('-id')\
+            .values_list('id', flat=True).first() or 0
+        Comment.objects.bulk_create(
+            Comment(
+                post_id=post.id,
+                username=f'reader{self.random.randint(1, 10000)}',
+                content=self.sentence(self.random.randint(5, 30)),
+            )
+            for post, comments in zip(posts, comments_per_post)
+            for _ in range(comments)
+        )
+        comments = Comment.objects.filter(id__gt=last_comment_id)\
+            .values_list('id', 'post_id')
+
+        Notification.objects.bulk_create(
+            Notification(
+                post_id=post_id, comment_id=str(comment_id),
+                viewed=self.random.random() < 0.5,
+            )
+            for comment_id, post_id in comments.iterator()
+        )
+
+        get_search_backend().index(posts)
+
+        return sum(comments_per_post)
@@ -1,23 +1,85 @@
 # Django
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.shortcuts import reverse
 from django.db import models
+from django.utils.text import Truncator, slugify
 
 
 # Third party
 from filebrowser.fields import FileBrowseField
 from tinymce import HTMLField
 
+# Local apps
+from posts.helpers import html_to_text
 
-class Author(models.Model):
+
+EXCERPT_LENGTH = 200
+
+
+class CounterFieldsMixin:
+    """
+    Keep save() from writing counter_fields back to the database, counters are
+    only changed with UPDATE statements (refer to posts.counters), so the
+    value loaded within the instance may already be stale.
+
+    Saves without update_fields keep Django's behaviour, post_save receivers
+    get update_fields=None and a row deleted meanwhile is inserted again, the
+    counters are only left out of their UPDATE.
+    """
+    counter_fields = ()
+
+    def get_saved_fields(self):
+        """
+        Return names of the fields save() writes without update_fields, all
+        but counter_fields and, as Django does for deferred instances, the
+        deferred fields, which would be loaded with a query each otherwise.
+        auto_now fields are set by save(), so they're kept.
+        """
+        deferred = self.get_deferred_fields()
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.name not in self.counter_fields
+            and (field.attname not in deferred or getattr(field, 'auto_now', False))
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = [
+                    name for name in update_fields if name not in self.counter_fields
+                ]
+            # Django saves the loaded fields of deferred instances with
+            # update_fields too, these also keep their auto_now fields.
+            elif self.get_deferred_fields():
+                kwargs['update_fields'] = self.get_saved_fields()
+        super().save(*args, **kwargs)
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        values = [value for value in values if value[0].name not in self.counter_fields]
+        return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+
+
+class Author(CounterFieldsMixin, models.Model):
     name = models.OneToOneField(User, on_delete=models.CASCADE)
 
+    # Maintained by posts.counters, repair with repair_counters command.
+    unread_notifications = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('unread_notifications',)
+
     class Meta:
         verbose_name_plural = 'Authors'
 
 
 class Category(models.Model):
     name = models.CharField(max_length=20)
+    # Unique, the URL of the category, post_filter_by_category looks it up
+    # within the cached categories. Nullable so the column can be added to a
+    # table holding categories, NULLs never clash, then backfill it with
+    # backfill_category_slugs, save() always sets it.
+    slug = models.SlugField(max_length=20, unique=True, blank=True, null=True)
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -25,8 +87,38 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def clean(self):
+        if not (self.slug or slugify(self.name)):
+            raise ValidationError({'slug': 'Enter a slug, the name has none.'})
+
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            self.slug = self.unique_slug()
+        super().save(*args, **kwargs)
+
+    def unique_slug(self):
+        """
+        Return slug of the name no other category uses, suffixed with -2, -3,
+        etc. if needed, e.g. 'C#' and 'C++' give 'c' and 'c-2'. Names giving
+        no slug at all get 'category'.
+        """
+        max_length = self._meta.get_field('slug').max_length
+        base = slugify(self.name)[:max_length] or 'category'
+
+        slug = base
+        number = 2
+        while Category.objects.filter(slug=slug).exclude(pk=self.pk).exists():
+            suffix = f'-{number}'
+            slug = base[:max_length - len(suffix)] + suffix
+            number += 1
+
+        return slug
+
+    def get_absolute_url(self):
+        return reverse('post_filter_by_category', kwargs={'category': self.slug})
+
 
-class Post(models.Model):
+class Post(CounterFieldsMixin, models.Model):
     author = models.ForeignKey(Author, on_delete=models.CASCADE, null=True)
     categories = models.ManyToManyField(Category)
 
@@ -34,14 +126,75 @@ class Post(models.Model):
     thumbnail = FileBrowseField(max_length=200, null=True)
     content = HTMLField(null=True)
     created_time = models.DateTimeField(auto_now_add=True)
+    # Also bumped by new and deleted comments, validator of conditional GETs.
+    updated_time = models.DateTimeField(auto_now=True)
+
+    # Derived from content on save, backfill with backfill_post_text command.
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH, blank=True, editable=False)
+    plain_text = models.TextField(blank=True, editable=False)
+
+    # Maintained by posts.counters, repair with repair_counters command.
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # Maintained by posts.view_counts, can't be repaired.
+    views = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('comment_count', 'views')
 
     class Meta:
         ordering = ['-created_time']
         verbose_name_plural = 'Posts'
+        indexes = [
+            # Post lists, keyset paginated on (created_time, id).
+            models.Index(fields=['created_time', 'id'], name='post_created_idx'),
+            # post_related_to_author.
+            models.Index(fields=['author', 'created_time'], name='post_author_created_idx'),
+            # Newest updated_time of post lists Last-Modified.
+            models.Index(fields=['updated_time'], name='post_updated_idx'),
+            # Most viewed posts.
+            models.Index(fields=['views', 'id'], name='post_views_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Thumbnail as stored, refer to thumbnail_changed.
+        if 'thumbnail' in field_names:
+            instance._stored_thumbnail = str(values[field_names.index('thumbnail')] or '')
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            update_fields = self.get_saved_fields()
+        elif 'content' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'excerpt', 'plain_text'}
+
+        if 'content' in update_fields:
+            self.set_text_fields()
+        super().save(*args, **kwargs)
+        if 'thumbnail' in update_fields:
+            self._stored_thumbnail = str(self.thumbnail or '')
+
+    def thumbnail_changed(self):
+        """
+        Return whether thumbnail differs from the stored one, always True for
+        new posts, never while it's deferred, it can't have been assigned.
+        """
+        if 'thumbnail' in self.get_deferred_fields():
+            return False
+        return str(self.thumbnail or '') != getattr(self, '_stored_thumbnail', None)
+
+    def set_text_fields(self):
+        """
+        Set plain_text and excerpt from the HTML content, so list views and
+        search never have to load or parse content.
+        """
+        self.plain_text = html_to_text(self.content)
+        self.excerpt = Truncator(self.plain_text).chars(EXCERPT_LENGTH)
+
     def get_create_url(self):
         return reverse('post_create', kwargs={'id': self.id})
 
@@ -65,6 +218,10 @@ class Comment(models.Model):
     class Meta:
         ordering = ['-created_time']
         verbose_name_plural = 'Comments'
+        indexes = [
+            # Comments of a post, keyset paginated on (created_time, id).
+            models.Index(fields=['post', 'created_time', 'id'], name='comment_post_created_idx'),
+        ]
 
 
 class Notification(models.Model):
@@ -76,6 +233,10 @@ class Notification(models.Model):
     class Meta:
         ordering = ['-id']
         verbose_name_plural = 'Notifications'
+        indexes = [
+            # Unread notifications of a post.
+            models.Index(fields=['post', 'viewed'], name='notification_post_viewed_idx'),
+        ]
 
     def get_feedback_message(self):
         """
@@ -85,11 +246,12 @@ class Notification(models.Model):
 
     def get_absolute_url(self):
         """
-        Jump directly to comment.
+        Jump directly to comment, the comment query parameter makes
+        post_details open the comments page that holds the comment.
 
         - if Post.id = 1
         - and related Comment.id = 24
-        - get_absolute_url returns /post/1/#2.
+        - get_absolute_url returns /post/1/?comment=24#24.
         """
-        return reverse('post_details', kwargs={'id': self.post_id}) + "#" +\
-            self.comment_id
+        return reverse('post_details', kwargs={'id': self.post_id}) +\
+            f"?comment={self.comment_id}#{self.comment_id}"
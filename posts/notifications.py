@@ -0,0 +1,139 @@
+"""
+Module for creating the notifications of new comments off the request path.
+
+settings.POSTS_NOTIFICATION_QUEUE picks how notifications are created:
+- 'sync' (default) creates the notification right away within the comment
+  transaction, used by tests.
+- 'thread' queues it once the comment transaction commits, a worker thread
+  then drains the queue and creates the queued notifications in batches.
+"""
+
+# Python
+import atexit
+import logging
+import queue
+import threading
+import time
+
+# Django
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+# Local apps
+from posts.counters import recount_unread_notifications
+from posts.models import Author, Notification
+
+
+logger = logging.getLogger(__name__)
+
+
+def create_notifications(comments):
+    """
+    Create the notifications of comments, a list of (post_id, comment_id),
+    with a single INSERT then recount the unread notifications of the authors
+    of the related posts.
+
+    Comments already notified are skipped by the UNIQUE constraint of
+    Notification.comment_id.
+    """
+    if not comments:
+        return
+
+    with transaction.atomic():
+        Notification.objects.bulk_create(
+            [
+                Notification(post_id=post_id, comment_id=str(comment_id))
+                for post_id, comment_id in comments
+            ],
+            ignore_conflicts=True
+        )
+        post_ids = {post_id for post_id, _ in comments}
+        recount_unread_notifications(Author.objects.filter(post__id__in=post_ids))
+
+
+class NotificationQueue:
+    """
+    In-process queue drained by a daemon worker thread, which waits up to
+    max_wait seconds after the first queued comment for a batch to fill.
+    """
+
+    def __init__(self, batch_size=100, max_wait=0.5):
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.worker = None
+        self.lock = threading.Lock()
+
+    def put(self, post_id, comment_id):
+        self.start()
+        self.queue.put((post_id, comment_id))
+
+    def start(self):
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(
+                    target=self.run, name='notification-queue', daemon=True
+                )
+                self.worker.start()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self.process(batch)
+
+    def process(self, batch):
+        """
+        Create the notifications of batch, if the batch fails, e.g. a post
+        got deleted while its notification was queued, retry each one alone
+        so only the failing ones are dropped.
+        """
+        close_old_connections()
+        try:
+            create_notifications(batch)
+        except Exception:
+            if len(batch) == 1:
+                logger.exception('Failed to create notification %s.', batch[0])
+            else:
+                for comment in batch:
+                    self.process([comment])
+        finally:
+            close_old_connections()
+
+    def flush(self):
+        """
+        Create every queued notification within the calling thread.
+        """
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        self.process(batch)
+
+
+notification_queue = NotificationQueue()
+atexit.register(notification_queue.flush)
+
+
+def enqueue_notification(post_id, comment_id):
+    """
+    Schedule the notification of a new comment according to
+    settings.POSTS_NOTIFICATION_QUEUE.
+    """
+    if getattr(settings, 'POSTS_NOTIFICATION_QUEUE', 'sync') == 'thread':
+        transaction.on_commit(
+            lambda: notification_queue.put(post_id, comment_id)
+        )
+    else:
+        create_notifications([(post_id, comment_id)])
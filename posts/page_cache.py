@@ -0,0 +1,185 @@
+"""
+Full-page cache of the post pages for anonymous users, the bulk of the
+traffic, so their requests are answered without queries nor rendering.
+
+Each cached page is tagged with surrogate keys naming what it shows:
+- 'list', the post list pages.
+- 'category:<slug>', the post list pages of the category.
+- 'post:<id>', the page of the post and its comments.
+- 'sidebar', the categories of the side widgets, on every page.
+
+Every tag has a version counter, a page is stored along with the versions of
+its tags and only served while they didn't change, so the receivers of
+posts/signals.py purge all the pages of a tag by bumping its version, after
+the transaction commits. Missed pages are rendered from the primary database.
+The most viewed posts of the sidebar are only refreshed as pages expire, after
+PAGE_CACHE_TIMEOUT.
+
+settings.POSTS_PAGE_CACHE names the cache alias of the pages, None (default)
+turns the page cache off.
+"""
+
+# Python
+import hashlib
+import time
+from functools import wraps
+
+# Django
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+# Local apps
+from blog.routers import read_primary
+from posts.cache import get_categories
+from posts.conditional import is_cacheable
+
+
+PAGE_CACHE_TIMEOUT = 60 * 5
+
+PAGE_KEY = 'pages:page:{}'
+TAG_KEY = 'pages:tag:{}'
+
+# Headers of the response kept along with its content.
+PAGE_HEADERS = ('ETag', 'Last-Modified')
+
+
+def get_page_cache():
+    alias = getattr(settings, 'POSTS_PAGE_CACHE', None)
+    return caches[alias] if alias else None
+
+
+def get_tag_versions(page_cache, tags):
+    """
+    Return dict of tag: current version of tags, missing counters start from
+    the current time, refer to posts.cache.get_generation.
+    """
+    keys = {TAG_KEY.format(tag): tag for tag in tags}
+    versions = page_cache.get_many(keys)
+    for key in keys.keys() - versions.keys():
+        page_cache.add(key, int(time.time() * 1000), None)
+        versions[key] = page_cache.get(key)
+
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def purge_pages(*tags):
+    """
+    Invalidate every cached page tagged with any of tags, once the current
+    transaction commits, a page rendered before the commit would otherwise be
+    cached under the new versions.
+    """
+    page_cache = get_page_cache()
+    if page_cache is None:
+        return
+
+    def bump_tags():
+        for tag in tags:
+            try:
+                page_cache.incr(TAG_KEY.format(tag))
+            # No counter, so no page can be stored under its current version.
+            except ValueError:
+                pass
+
+    transaction.on_commit(bump_tags)
+
+
+def purge_post_pages(post, deleted=False):
+    """
+    Invalidate the pages showing post, the categories of a deleted post are
+    gone already, so all category pages are.
+    """
+    if get_page_cache() is None:
+        return
+
+    if deleted:
+        slugs = [category.slug for category in get_categories()]
+    else:
+        slugs = post.categories.values_list('slug', flat=True)
+
+    purge_pages('list', f'post:{post.pk}', *[f'category:{slug}' for slug in slugs])
+
+
+def purge_category_pages(category_ids=None):
+    """
+    Invalidate the pages of the categories of category_ids, all categories
+    by default.
+    """
+    if get_page_cache() is None:
+        return
+
+    purge_pages(*[
+        f'category:{category.slug}' for category in get_categories()
+        if category_ids is None or category.id in category_ids
+    ])
+
+
+def is_fresh(page_cache, versions):
+    keys = {TAG_KEY.format(tag): version for tag, version in versions.items()}
+    return page_cache.get_many(keys) == keys
+
+
+def cached_page_response(request, entry):
+    headers = entry['headers']
+    response = get_conditional_response(
+        request, etag=headers.get('ETag'),
+        last_modified=parse_http_date_safe(headers.get('Last-Modified', '')),
+    )
+    if response is None:
+        response = HttpResponse(entry['content'], content_type=entry['content_type'])
+
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+def cache_anonymous_page(get_tags):
+    """
+    Cache the 200 responses of the decorated view for anonymous users without
+    pending messages, keyed by URL and tagged with
+    get_tags(request, *args, **kwargs) and 'sidebar'.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            page_cache = get_page_cache()
+            if page_cache is None or request.method != 'GET' \
+                    or request.user.is_authenticated or not is_cacheable(request):
+                return view(request, *args, **kwargs)
+
+            digest = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = PAGE_KEY.format(digest)
+
+            entry = page_cache.get(key)
+            if entry is not None and is_fresh(page_cache, entry['tags']):
+                return cached_page_response(request, entry)
+
+            # Read before rendering, so a purge while rendering isn't missed.
+            versions = get_tag_versions(
+                page_cache, ['sidebar', *get_tags(request, *args, **kwargs)]
+            )
+            # Rendered from the primary, a lagging replica could still show
+            # what was purged, cached then under the new versions.
+            with read_primary():
+                response = view(request, *args, **kwargs)
+
+            if response.status_code == 200 and not response.streaming \
+                    and not response.cookies:
+                page_cache.set(key, {
+                    'content': response.content,
+                    'content_type': response['Content-Type'],
+                    'headers': {
+                        header: response[header] for header in PAGE_HEADERS
+                        if response.has_header(header)
+                    },
+                    'tags': versions,
+                }, PAGE_CACHE_TIMEOUT)
+
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,168 @@
+"""
+Full-text search over posts.
+
+The backend is picked with settings.POSTS_SEARCH_BACKEND (dotted path to a
+BaseSearchBackend subclass). When it's not set, SQLite databases use an FTS5
+index and other databases fall back to plain icontains lookups.
+"""
+
+# Python
+import re
+from functools import lru_cache
+
+# Django
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+# Local apps
+from posts.models import Post
+
+
+class BaseSearchBackend:
+    """
+    Interface every search backend implements, backends that don't keep an
+    index may leave setup, index, remove and clear as no-op.
+    """
+
+    def setup(self, using=None):
+        """
+        Create whatever storage the index needs within the database using,
+        the one posts are written to by default, safe to call repeatedly.
+        """
+
+    def index(self, posts):
+        """
+        Add or replace the given Post objects within the index, posts must
+        have title and plain_text loaded.
+        """
+
+    def remove(self, post_ids):
+        """
+        Drop the given Post ids from the index.
+        """
+
+    def clear(self):
+        """
+        Drop every entry from the index.
+        """
+
+    def search(self, query):
+        """
+        Return Post QuerySet matching query, most relevant first.
+        """
+        raise NotImplementedError
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    No index, scan the posts table with icontains on the plain text of
+    posts rather than their HTML.
+    """
+
+    def search(self, query):
+        return Post.objects.filter(
+            Q(title__icontains=query) | Q(plain_text__icontains=query)
+        )
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """
+    Index posts within an FTS5 virtual table, the table rowid is the Post id,
+    and rank results with bm25() weighting title matches above body matches.
+    """
+    table = 'posts_post_fts'
+    title_weight = 10.0
+    body_weight = 1.0
+
+    def get_cursor(self, using=None):
+        """
+        Return cursor of the database using, the one posts are written to by
+        default, their index is kept along with them, and copied with them to
+        the read replica.
+        """
+        return connections[using or router.db_for_write(Post)].cursor()
+
+    def setup(self, using=None):
+        with self.get_cursor(using) as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} "
+                f"USING fts5(title, body, tokenize='unicode61 remove_diacritics 2')"
+            )
+
+    def index(self, posts):
+        rows = [(post.id, post.title, post.plain_text) for post in posts]
+        if not rows:
+            return
+
+        with self.get_cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {self.table} WHERE rowid = %s",
+                [(row[0],) for row in rows]
+            )
+            cursor.executemany(
+                f"INSERT INTO {self.table} (rowid, title, body) VALUES (%s, %s, %s)",
+                rows
+            )
+
+    def remove(self, post_ids):
+        with self.get_cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {self.table} WHERE rowid = %s",
+                [(post_id,) for post_id in post_ids]
+            )
+
+    def clear(self):
+        with self.get_cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+
+    def search(self, query):
+        match = self.build_match(query)
+        if not match:
+            return Post.objects.none()
+
+        # Join the FTS table on rowid, so SQLite answers the MATCH from the
+        # index first then fetches only the matching posts by primary key.
+        return Post.objects.extra(
+            select={'rank': f'bm25({self.table}, %s, %s)'},
+            select_params=(self.title_weight, self.body_weight),
+            tables=[self.table],
+            where=[
+                f'{self.table}.rowid = {Post._meta.db_table}.id',
+                f'{self.table} MATCH %s',
+            ],
+            params=[match],
+        ).order_by('rank', '-created_time')
+
+    @staticmethod
+    def build_match(query):
+        """
+        Turn user input into an FTS5 query, every word is quoted so the FTS5
+        syntax characters are matched literally, and the last word is matched
+        as prefix.
+
+        - query = 'django orm opt'
+        - build_match returns '"django" "orm" "opt"*'.
+        """
+        words = re.findall(r'\w+', query)
+        if not words:
+            return ''
+
+        terms = [f'"{word}"' for word in words]
+        terms[-1] += '*'
+        return ' '.join(terms)
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    """
+    Return the configured search backend instance.
+    """
+    backend_path = getattr(settings, 'POSTS_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+
+    if connections[router.db_for_read(Post)].vendor == 'sqlite':
+        return SQLiteFTS5Backend()
+    return DatabaseSearchBackend()
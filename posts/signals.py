@@ -1,27 +1,189 @@
 # Django
-from django.db import IntegrityError
-from django.db.models.signals import post_delete, post_save
+from django.db import router, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 
 # Local Apps
-from posts.models import Comment, Notification, Post
+from posts.cache import (bump_posts_generation, invalidate_categories,
+                         invalidate_category_post_keys,
+                         invalidate_sitemap_shard)
+from posts.counters import add_to_comment_count, add_to_unread_notifications
+from posts.models import Category, Comment, Notification, Post
+from posts.notifications import enqueue_notification
+from posts.page_cache import (purge_category_pages, purge_pages,
+                              purge_post_pages)
+from posts.search import get_search_backend
+from posts.thumbnails import schedule_derivatives
+from posts.view_counts import invalidate_most_viewed
+
+
+# Cache invalidations run with transaction.on_commit, a request reading the
+# cache before the commit would otherwise cache the old rows again.
+
+
+def setup_search_index(sender, using, **kwargs):
+    """
+    Create the search index storage within the migrated database, connected
+    to post_migrate within PostsConfig.ready().
+    """
+    if router.allow_migrate_model(using, Post):
+        get_search_backend().setup(using)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_categories_on_change(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_categories)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_posts_generation_on_change(sender, **kwargs):
+    """
+    Invalidate every cached post list page at once.
+    """
+    transaction.on_commit(bump_posts_generation)
+
+
+@receiver(m2m_changed, sender=Post.categories.through)
+def bump_posts_generation_on_categories_change(sender, action, **kwargs):
+    if action.startswith('post_'):
+        transaction.on_commit(bump_posts_generation)
+
+
+@receiver(m2m_changed, sender=Post.categories.through)
+def invalidate_posting_lists_on_categories_change(sender, instance, action, reverse,
+                                                  pk_set, **kwargs):
+    """
+    Drop the cached posting lists of the categories a post was added to or
+    removed from, they are rebuilt on the next category page view.
+    """
+    if not action.startswith('post_'):
+        return
+
+    if reverse:
+        category_ids = [instance.pk]
+    elif pk_set is not None:
+        category_ids = list(pk_set)
+    # post_clear doesn't tell which categories were cleared.
+    else:
+        category_ids = None
+
+    transaction.on_commit(lambda: invalidate_category_post_keys(category_ids))
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_posting_lists_on_post_delete(sender, instance, **kwargs):
+    # The M2M rows are already gone, so the categories of the post are unknown.
+    transaction.on_commit(invalidate_category_post_keys)
+
+
+@receiver(post_delete, sender=Category)
+def invalidate_posting_list_on_category_delete(sender, instance, **kwargs):
+    category_id = instance.pk
+    transaction.on_commit(lambda: invalidate_category_post_keys([category_id]))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_sitemap_shard_on_change(sender, instance, **kwargs):
+    """
+    Drop the cached sitemap shard of the post id range, the other shards stay.
+    """
+    # The id of a deleted instance is cleared before the commit.
+    post_id = instance.id
+    transaction.on_commit(lambda: invalidate_sitemap_shard(post_id))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_most_viewed_on_change(sender, **kwargs):
+    # Titles may have changed, or a listed post been deleted.
+    transaction.on_commit(invalidate_most_viewed)
+
+
+@receiver(post_save, sender=Post)
+def purge_post_pages_on_save(sender, instance, **kwargs):
+    purge_post_pages(instance)
+
+
+@receiver(post_delete, sender=Post)
+def purge_post_pages_on_delete(sender, instance, **kwargs):
+    purge_post_pages(instance, deleted=True)
+
+
+@receiver(m2m_changed, sender=Post.categories.through)
+def purge_category_pages_on_categories_change(sender, instance, action, reverse,
+                                              pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+
+    if reverse:
+        purge_category_pages([instance.pk])
+    # post_clear doesn't tell which categories were cleared.
+    else:
+        purge_category_pages(pk_set)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def purge_pages_on_category_change(sender, **kwargs):
+    # Every page lists the categories within its sidebar.
+    purge_pages('sidebar')
 
 
 @receiver(post_save, sender=Comment)
-def create_notification_on_new_comment(sender, instance, **kwargs):
-    post = Post.objects.only('id').get(pk=instance.post_id)
+@receiver(post_delete, sender=Comment)
+def purge_post_pages_on_comment_change(sender, instance, **kwargs):
+    purge_pages(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Post)
+def index_post_on_save(sender, instance, **kwargs):
+    get_search_backend().index([instance])
+
 
-    try:
-        Notification.objects.create(
-            post=post,
-            comment_id=instance.id
-        )
-    # On UNIQUE constrains error, don't create object.
-    except IntegrityError:
-        pass
+@receiver(post_save, sender=Post)
+def generate_thumbnail_derivatives_on_save(sender, instance, update_fields, **kwargs):
+    # Only new thumbnails, generate_thumbnails regenerates the others.
+    if (update_fields is None or 'thumbnail' in update_fields) \
+            and instance.thumbnail_changed() and instance.thumbnail:
+        schedule_derivatives(str(instance.thumbnail))
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post_on_delete(sender, instance, **kwargs):
+    get_search_backend().remove([instance.id])
+
+
+@receiver(post_save, sender=Comment)
+def create_notification_on_new_comment(sender, instance, created, **kwargs):
+    if created:
+        enqueue_notification(instance.post_id, instance.id)
+
+
+@receiver(post_save, sender=Comment)
+def increment_comment_count_on_new_comment(sender, instance, created, **kwargs):
+    if created:
+        add_to_comment_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def delete_notification_on_comment_delete(sender, instance, **kwargs):
+    """
+    Delete the notification of the comment only, and take it off the unread
+    count of the post author if it wasn't viewed yet.
+    """
+    notifications = Notification.objects.filter(comment_id=str(instance.id))
+    unread, _ = notifications.filter(viewed=False).delete()
+    if unread:
+        add_to_unread_notifications({'post__id': instance.post_id}, -unread)
+    else:
+        notifications.delete()
 
 
 @receiver(post_delete, sender=Comment)
-def delete_notification_on_post_delete(sender, instance, **kwargs):
-    post = Post.objects.only('id').get(pk=instance.post_id)
-    Notification.objects.filter(post=post).delete()
+def decrement_comment_count_on_comment_delete(sender, instance, **kwargs):
+    add_to_comment_count(instance.post_id, -1)
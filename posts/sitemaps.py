@@ -0,0 +1,167 @@
+"""
+Sitemaps of posts and categories, for search engines to find every post
+without crawling the post list pages.
+
+- /sitemap.xml, index listing the categories sitemap and the posts shards.
+- /sitemap-categories.xml, home and category pages.
+- /sitemap-posts-<number>.xml, posts shard, the posts with ids within
+  [number * SITEMAP_SHARD_SIZE + 1, (number + 1) * SITEMAP_SHARD_SIZE], so a
+  shard never lists more than the 50,000 URLs a sitemap may hold.
+
+A shard is streamed from a server-side iterator as it's read, then cached.
+Saving or deleting a post, or its comments changing its lastmod (refer to
+posts.counters.add_to_comment_count), only drops the shard of its id, the
+other shards keep being served from the cache. URLs are cached without the
+scheme and host, added when the shard is served.
+"""
+
+# Python
+from xml.sax.saxutils import escape
+
+# Django
+from django.conf import settings
+from django.db import router
+from django.db.models import Max
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import reverse
+from django.views.decorators.http import require_GET
+
+# Local apps
+from blog.routers import read_primary, replica_read
+from posts.cache import (SITEMAP_SHARD_SIZE, get_categories,
+                         get_sitemap_shard, set_sitemap_shard)
+from posts.export import iterate_in_thread
+from posts.models import Post
+
+
+SITEMAP_CHUNK_SIZE = 2000
+
+# Reversed as the id of post_details, every post URL is then built from the
+# text around it rather than with a reverse() per post.
+POST_ID_PLACEHOLDER = 2147483647
+
+# Replaced by the scheme and host of the request when served.
+ORIGIN = '{origin}'
+
+SITEMAP_CONTENT_TYPE = 'application/xml'
+URLSET_START = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+)
+URLSET_END = '</urlset>\n'
+
+
+def get_origin(request):
+    return request.build_absolute_uri('/').rstrip('/')
+
+
+def url_entry(location, last_modified=None):
+    entry = f'<url><loc>{escape(location)}</loc>'
+    if last_modified:
+        entry += f'<lastmod>{last_modified.date().isoformat()}</lastmod>'
+    return entry + '</url>\n'
+
+
+def get_post_url_parts():
+    """
+    Return (prefix, suffix) of the post_details URL around the post id.
+    """
+    url = reverse('post_details', kwargs={'id': POST_ID_PLACEHOLDER})
+    prefix, _, suffix = url.rpartition(str(POST_ID_PLACEHOLDER))
+    return prefix, suffix
+
+
+def generate_posts_shard(number, using):
+    """
+    Yield the XML of posts shard number chunk by chunk, then cache it.
+    """
+    prefix, suffix = get_post_url_parts()
+
+    rows = Post.objects.using(using)\
+        .filter(
+            id__gt=number * SITEMAP_SHARD_SIZE,
+            id__lte=(number + 1) * SITEMAP_SHARD_SIZE,
+        )\
+        .order_by('id').values_list('id', 'updated_time')\
+        .iterator(chunk_size=SITEMAP_CHUNK_SIZE)
+
+    parts = [URLSET_START]
+    yield URLSET_START
+    chunk = []
+    for post_id, updated_time in rows:
+        chunk.append(url_entry(f'{ORIGIN}{prefix}{post_id}{suffix}', updated_time))
+        if len(chunk) == SITEMAP_CHUNK_SIZE:
+            parts.append(''.join(chunk))
+            yield parts[-1]
+            chunk = []
+
+    parts.append(''.join(chunk) + URLSET_END)
+    yield parts[-1]
+
+    set_sitemap_shard(number, ''.join(parts))
+
+
+@require_GET
+@replica_read
+def sitemap_index(request):
+    origin = get_origin(request)
+    last_id = Post.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    shards = (last_id - 1) // SITEMAP_SHARD_SIZE + 1 if last_id else 0
+
+    locations = [reverse('sitemap_categories')] + [
+        reverse('sitemap_posts', kwargs={'number': number})
+        for number in range(shards)
+    ]
+    content = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n' +
+        ''.join(
+            f'<sitemap><loc>{escape(origin + location)}</loc></sitemap>\n'
+            for location in locations
+        ) +
+        '</sitemapindex>\n'
+    )
+
+    return HttpResponse(content, content_type=SITEMAP_CONTENT_TYPE)
+
+
+@require_GET
+def sitemap_categories(request):
+    origin = get_origin(request)
+    locations = [reverse('post_list')] + [
+        category.get_absolute_url() for category in get_categories()
+    ]
+    content = URLSET_START + ''.join(
+        url_entry(origin + location) for location in locations
+    ) + URLSET_END
+
+    return HttpResponse(content, content_type=SITEMAP_CONTENT_TYPE)
+
+
+@require_GET
+@replica_read
+def sitemap_posts(request, number):
+    origin = get_origin(request)
+
+    content = get_sitemap_shard(number)
+    if content is not None:
+        return HttpResponse(
+            content.replace(ORIGIN, origin), content_type=SITEMAP_CONTENT_TYPE
+        )
+
+    last_id = Post.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    if number * SITEMAP_SHARD_SIZE >= last_id:
+        raise Http404('No such sitemap.')
+
+    # Rows are read while the response streams, after replica_read returned,
+    # so the database is picked now, the primary as the shard gets cached.
+    with read_primary():
+        using = router.db_for_read(Post)
+    chunks = generate_posts_shard(number, using)
+    if getattr(settings, 'POSTS_STREAM_IN_THREAD', False):
+        chunks = iterate_in_thread(chunks)
+
+    return StreamingHttpResponse(
+        (chunk.replace(ORIGIN, origin) for chunk in chunks),
+        content_type=SITEMAP_CONTENT_TYPE,
+    )
@@ -0,0 +1,58 @@
+# Django
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+# Local apps
+from posts.thumbnails import derivative_name, get_derivatives
+
+
+register = template.Library()
+
+# Rendered width of each variant, for the sizes attribute.
+THUMBNAIL_SIZES = {
+    'card': '(min-width: 768px) 730px, 100vw',
+    'detail': '(min-width: 992px) 730px, 100vw',
+}
+
+
+@register.simple_tag
+def thumbnail(image, variant, css_class='', alt=''):
+    """
+    Return <picture> serving the derivatives of image (Post.thumbnail) as
+    WebP, or JPEG for browsers without WebP support, at the width matching
+    the screen.
+
+    Fall back to the original upload until the derivatives are generated.
+    Candidates are listed at the width of their file, below the variant width
+    when the original is narrower.
+
+    Usage:
+        {% load thumbnails %}
+        {% thumbnail post.thumbnail 'card' 'card-img-top' post.title %}
+    """
+    if not image:
+        return ''
+
+    name = str(image)
+    derivatives = get_derivatives(name)[variant]
+    if not derivatives:
+        return format_html(
+            '<img class="{}" src="{}" alt="{}">', css_class, image.url, alt
+        )
+
+    def srcset(extension):
+        return ', '.join(
+            f'{default_storage.url(derivative_name(name, variant, width, extension))} {actual_width}w'
+            for width, actual_width in derivatives
+        )
+
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img class="{}" src="{}" srcset="{}" sizes="{}" alt="{}" loading="lazy">'
+        '</picture>',
+        srcset('webp'), THUMBNAIL_SIZES[variant],
+        css_class, default_storage.url(derivative_name(name, variant, derivatives[0][0], 'jpg')),
+        srcset('jpg'), THUMBNAIL_SIZES[variant], alt,
+    )
@@ -0,0 +1,16 @@
+# Django
+from django import template
+
+# Local apps
+from posts.view_counts import get_most_viewed
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def most_viewed_posts():
+    """
+    Return the cached most viewed posts snapshot, refer to posts/view_counts.py.
+    """
+    return get_most_viewed()
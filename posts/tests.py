@@ -1,3 +1,1623 @@
-from django.test import TestCase
+# Python
+import asyncio
+import gzip
+import html
+import importlib
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+from base64 import urlsafe_b64encode
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+# Django
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models.signals import post_save
+from django.shortcuts import reverse
+from django.template import Context, Template
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve
+from django.utils import timezone
+
+# Third party
+from PIL import Image
+
+# Local apps
+from accounts.backends import CachedModelBackend
+from blog import storage as storage_module, urls as blog_urls
+from blog.metrics import (QueryBudgetExceeded, get_views_metrics,
+                          reset_views_metrics)
+from blog.routers import PIN_COOKIE, REPLICA, read_primary, reading_replica, replica_read
+from blog.storage import CompressedManifestStaticFilesStorage
+from posts import async_views, urls as posts_urls, views
+from posts.cache import get_categories
+from posts.counters import add_to_unread_notifications
+from posts.deletion import delete_posts
+from posts.export import export_posts
+from posts.helpers import (decode_cursor, encode_cursor, key_comes_before,
+                           keyset_filter, keyset_pagination,
+                           keyset_pagination_of_keys)
+from posts.models import (EXCERPT_LENGTH, Author, Category, Comment,
+                          Notification, Post)
+from posts.notifications import NotificationQueue
+from posts.search import SQLiteFTS5Backend, get_search_backend
+from posts.signals import setup_search_index
+from posts.view_counts import add_views, get_most_viewed
+
+
+class QueryPlanTestCase(TestCase):
+    """
+    Run EXPLAIN QUERY PLAN on every query executed by the views of
+    posts/views.py and fail if any of them reads a whole table or index.
+
+    SQLite plans queries for large tables when there are no statistics
+    (ANALYZE), so a handful of rows is enough to catch a missing index.
+    """
+    # Tables read in full by design, the categories list is small and cached.
+    full_scan_allowed = {'posts_category'}
+    # Tables, or whole indexes of them, read row by row.
+    full_scan = re.compile(
+        r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?( USING (?:COVERING )?INDEX \w+)?$'
+    )
+    # An index walked in its order stops at the LIMIT, e.g. the first page of
+    # a keyset paginated list.
+    limit = re.compile(r' LIMIT \d+$')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('author', password='password')
+        cls.author = Author.objects.create(name=cls.user)
+        cls.category = Category.objects.create(name='Python')
+
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, title=f'Post {i}', content=f'<p>Content {i}</p>'
+            )
+            for i in range(10)
+        ]
+        cls.post = cls.posts[0]
+        for post in cls.posts[::2]:
+            post.categories.add(cls.category)
+
+        cls.comments = [
+            Comment.objects.create(post=cls.post, username='reader', content=f'{i}')
+            for i in range(15)
+        ]
+        cls.notification = Notification.objects.first()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def capture_queries(self, method, url, data=None):
+        """
+        Return list of (sql, params) executed while requesting url.
+        """
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            if not many:
+                queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            response = getattr(self.client, method)(url, data or {})
+        self.assertLess(response.status_code, 400, url)
+
+        return queries
+
+    def assertNoFullScan(self, method, url, data=None):
+        queries = self.capture_queries(method, url, data)
+        self.assertTrue(queries, f'{url} executed no queries.')
+
+        for sql, params in queries:
+            if not sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                continue
+
+            for step in self.get_full_scans(sql, params):
+                self.fail(f'{url} full scan ({step}) within: {sql}')
+
+    def get_full_scans(self, sql, params=()):
+        """
+        Return the steps of the query plan of sql reading a whole table or
+        index, but the allowed ones.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            steps = [row[-1] for row in cursor.fetchall()]
+
+        full_scans = []
+        for step in steps:
+            match = self.full_scan.match(step)
+            if not match or match.group(1) in self.full_scan_allowed:
+                continue
+            if match.group(2) and self.limit.search(sql):
+                continue
+            full_scans.append(step)
+
+        return full_scans
+
+    def test_full_scans(self):
+        self.assertTrue(self.get_full_scans('SELECT id FROM posts_post'))
+        sql = 'SELECT id FROM posts_post ORDER BY created_time DESC, id DESC'
+        self.assertTrue(self.get_full_scans(sql))
+        self.assertFalse(self.get_full_scans(f'{sql} LIMIT 7'))
+        self.assertFalse(self.get_full_scans('SELECT id FROM posts_post WHERE id = 1'))
+
+    def test_post_list(self):
+        url = reverse('post_list')
+        self.assertNoFullScan('get', url)
+
+        cache.clear()
+        cursor = self.client.get(url).context['posts'].next_cursor
+        cache.clear()
+        self.assertNoFullScan('get', url, {'cursor': cursor})
+
+    def test_post_filter_by_category(self):
+        url = reverse('post_filter_by_category', kwargs={'category': 'python'})
+        self.assertNoFullScan('get', url)
+
+    @override_settings(POSTS_CATEGORY_POSTING_LISTS=False)
+    def test_post_filter_by_category_without_posting_lists(self):
+        url = reverse('post_filter_by_category', kwargs={'category': 'python'})
+        self.assertNoFullScan('get', url)
+
+    def test_post_search(self):
+        self.assertNoFullScan('get', reverse('post_search'), {'query': 'content'})
+
+    def test_post_details(self):
+        url = reverse('post_details', kwargs={'id': self.post.id})
+        self.assertNoFullScan('get', url)
+        self.assertNoFullScan('get', url, {'comment': self.comments[3].id})
+
+    def test_comment_list(self):
+        details = self.client.get(reverse('post_details', kwargs={'id': self.post.id}))
+        url = reverse('comment_list', kwargs={'id': self.post.id})
+        self.assertNoFullScan(
+            'get', url, {'cursor': details.context['comments'].next_cursor}
+        )
+
+    def test_comment_create(self):
+        url = reverse('comment_create', kwargs={'id': self.post.id})
+        self.assertNoFullScan('post', url, {'content': 'New comment'})
+
+    def test_post_create(self):
+        self.assertNoFullScan('get', reverse('post_create'))
+
+    def test_post_update(self):
+        url = reverse('post_update', kwargs={'id': self.post.id})
+        self.assertNoFullScan('get', url)
+        self.assertNoFullScan('post', url, {
+            'title': 'Updated', 'content': '<p>Updated</p>',
+            'categories': [self.category.id],
+        })
+
+    def test_post_delete(self):
+        url = reverse('post_delete', kwargs={'id': self.post.id})
+        self.assertNoFullScan('get', url)
+
+    def test_post_related_to_author(self):
+        self.assertNoFullScan('get', reverse('post_related_to_author'))
+
+    def test_notification_list(self):
+        self.assertNoFullScan('get', reverse('notification_list'))
+
+    def test_notification_details(self):
+        url = reverse('notification_details', kwargs={'id': self.notification.id})
+        self.assertNoFullScan('get', url)
+
+    def test_notification_mark_read(self):
+        self.assertNoFullScan('post', reverse('notification_mark_read'), {'all': ''})
+
+
+class ReplicaRoutingTestCase(TestCase):
+    """
+    Check blog/routers.py sends reads to the replica only while clients
+    haven't written, ReplicaDatabaseTestCase reads from a real replica.
+    """
+
+    def test_replica_read(self):
+        view = replica_read(lambda request: reading_replica.get())
+        request = RequestFactory().get('/')
+        self.assertTrue(view(request))
+        self.assertFalse(reading_replica.get())
+
+        request.COOKIES[PIN_COOKIE] = '1'
+        self.assertFalse(view(request))
+
+    def test_read_primary(self):
+        reading_replica.set(True)
+        self.addCleanup(reading_replica.set, False)
+        with read_primary():
+            self.assertFalse(reading_replica.get())
+        self.assertTrue(reading_replica.get())
+
+    def test_pin_after_write(self):
+        user = User.objects.create_user('author', password='password')
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('post_list'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+        response = self.client.post(reverse('notification_mark_read'), {'all': ''})
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+
+class ReplicaDatabaseTestCase(TransactionTestCase):
+    """
+    Check replica_read views read from a real replica, a copy of the test
+    database lagging one post behind, while the caches shared by every client
+    are filled from the primary.
+
+    The copy is taken with VACUUM INTO, which can't run within a transaction.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.replicated = Post.objects.create(title='Replicated', content='<p>Content</p>')
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'replica.sqlite3')
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM INTO %s', [path])
+
+        self.lagging = Post.objects.create(title='Lagging', content='<p>Content</p>')
+
+        replica = {**connections.databases['default'], 'NAME': path}
+        for databases in (settings.DATABASES, connections.databases):
+            patcher = mock.patch.dict(databases, {REPLICA: replica})
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.close_replica)
+
+    def close_replica(self):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+
+    def test_reads_from_replica(self):
+        url = reverse('post_details', kwargs={'id': self.lagging.id})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        self.client.cookies[PIN_COOKIE] = '1'
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_caches_filled_from_primary(self):
+        response = self.client.get(reverse('post_list'))
+        self.assertContains(response, 'Lagging')
+        self.assertContains(response, 'Replicated')
+
+
+class ConditionalGetTestCase(TestCase):
+    """
+    Check post pages answer 304 until the post or its comments change.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.post = Post.objects.create(title='Post', content='<p>Content</p>')
+
+    def setUp(self):
+        cache.clear()
+
+    def assertNotModified(self, url, etag, not_modified=True):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304 if not_modified else 200)
+
+    def test_post_details(self):
+        url = reverse('post_details', kwargs={'id': self.post.id})
+        etag = self.client.get(url)['ETag']
+        self.assertNotModified(url, etag)
+
+        Comment.objects.create(post=self.post, username='reader', content='New')
+        self.assertNotModified(url, etag, not_modified=False)
+
+    def test_comments_within_same_second(self):
+        url = reverse('post_details', kwargs={'id': self.post.id})
+        Comment.objects.create(post=self.post, username='reader', content='First')
+        etag = self.client.get(url)['ETag']
+
+        Comment.objects.create(post=self.post, username='reader', content='Second')
+        self.assertNotModified(url, etag, not_modified=False)
+
+    def test_post_list(self):
+        url = reverse('post_list')
+        response = self.client.get(url)
+        self.assertNotModified(url, response['ETag'])
+
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+
+        self.post.delete()
+        self.assertNotModified(url, response['ETag'], not_modified=False)
+
+
+class RequestMetricsTestCase(TestCase):
+    """
+    Check blog/metrics.py measures requests and enforces query budgets.
+    """
+
+    def setUp(self):
+        cache.clear()
+        reset_views_metrics()
+
+    def test_metrics(self):
+        Post.objects.create(title='Post', content='<p>Content</p>')
+        self.client.get(reverse('post_list'))
+
+        metrics = get_views_metrics()['post_list']
+        self.assertEqual(metrics['requests'], 1)
+        self.assertGreater(metrics['max_queries'], 0)
+        self.assertGreater(metrics['avg_template_ms'], 0)
+
+    @override_settings(QUERY_BUDGETS={'post_list': 0}, QUERY_BUDGETS_RAISE=True)
+    def test_query_budget(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('post_list'))
+
+
+class AsyncViewsTestCase(TransactionTestCase):
+    """
+    Check posts/urls.py routes the public read-only views to the async views
+    of posts/async_views.py when settings.POSTS_ASYNC_VIEWS is on, and these
+    run within worker threads, each with its own connection, queries counted.
+
+    The URLconfs are loaded again with the setting on, blog/urls.py too, it
+    holds the URL patterns of posts/urls.py it was loaded with. Worker threads
+    only see committed rows.
+    """
+
+    def setUp(self):
+        with override_settings(POSTS_ASYNC_VIEWS=True):
+            self.reload_urls()
+        self.addCleanup(self.reload_urls)
+        self.thread = threading.get_ident()
+        self.connection = connections['default']
+
+        cache.clear()
+        reset_views_metrics()
+        self.category = Category.objects.create(name='Python')
+        self.post = Post.objects.create(title='Post', content='<p>Content</p>')
+        self.post.categories.add(self.category)
+
+    def reload_urls(self):
+        importlib.reload(posts_urls)
+        importlib.reload(blog_urls)
+        clear_url_caches()
+
+    def test_urls(self):
+        for name in ('post_list', 'post_details', 'post_search', 'post_filter_by_category'):
+            view = resolve(reverse(name, kwargs={
+                'post_details': {'id': self.post.id},
+                'post_filter_by_category': {'category': 'python'},
+            }.get(name))).func
+            self.assertIs(view, getattr(async_views, name))
+            self.assertTrue(asyncio.iscoroutinefunction(view))
+
+    async def test_views(self):
+        for url in (
+            reverse('post_list'),
+            reverse('post_details', kwargs={'id': self.post.id}),
+            reverse('post_search') + '?query=post',
+            reverse('post_filter_by_category', kwargs={'category': 'python'}),
+        ):
+            response = await self.async_client.get(url)
+            self.assertContains(response, 'Post')
+
+        with self.assertLogs('django.request', 'WARNING'):
+            response = await self.async_client.post(reverse('post_list'))
+        self.assertEqual(response.status_code, 405)
+
+    async def test_worker_threads(self):
+        calls = []
+        get_posts = views.get_post_list_fragment
+
+        def get_post_list_fragment(*args):
+            calls.append((threading.get_ident(), connections['default']))
+            return get_posts(*args)
+
+        with mock.patch('posts.views.get_post_list_fragment', get_post_list_fragment):
+            await self.async_client.get(reverse('post_list'))
+
+        # Not the thread of setUp, which runs the sync code called with
+        # thread_sensitive=True, e.g. the middleware, with its connection.
+        [(thread, thread_connection)] = calls
+        self.assertNotEqual(thread, self.thread)
+        self.assertIsNot(thread_connection, self.connection)
+        self.assertGreater(get_views_metrics()['post_list']['max_queries'], 0)
+
+
+class StaticFilesStorageTestCase(SimpleTestCase):
+    """
+    Check blog/storage.py writes compressed copies of the hashed text files,
+    but not of small or incompressible ones.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+
+        settings_override = override_settings(STATIC_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def collect(self, files):
+        for name, content in files.items():
+            with open(os.path.join(self.root, name), 'wb') as file:
+                file.write(content)
+
+        storage = CompressedManifestStaticFilesStorage()
+        for name, hashed_name, processed in storage.post_process(
+            {name: (storage, name) for name in files}
+        ):
+            if isinstance(processed, Exception):
+                raise processed
+        return storage
+
+    def test_compressed(self):
+        content = b'body { margin: 0; }\n' * 100
+        storage = self.collect({'style.css': content})
+        name = storage.stored_name('style.css')
+        self.assertNotEqual(name, 'style.css')
+
+        with open(storage.path(f'{name}.gz'), 'rb') as file:
+            self.assertEqual(gzip.decompress(file.read()), content)
+        if storage_module.brotli is not None:
+            with open(storage.path(f'{name}.br'), 'rb') as file:
+                self.assertEqual(storage_module.brotli.decompress(file.read()), content)
+
+    def test_skipped(self):
+        storage = self.collect({
+            'small.js': b'var a = 1;',
+            'random.js': os.urandom(4096),
+            'image.png': b'\0' * 4096,
+        })
+        for name in ('small.js', 'random.js', 'image.png'):
+            for extension in ('.gz', '.br'):
+                path = storage.path(storage.stored_name(name) + extension)
+                self.assertFalse(os.path.exists(path), path)
+
+
+class PostExportTestCase(TestCase):
+    """
+    Check post_export streams every post with its related rows, with the
+    same number of queries per chunk of posts whatever their size.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Python')
+        cls.posts = [
+            Post.objects.create(title=f'Post {i}', content=f'<p>Content {i}</p>')
+            for i in range(5)
+        ]
+        for minutes, post in enumerate(cls.posts):
+            Post.objects.filter(id=post.id).update(
+                created_time=post.created_time + timedelta(minutes=minutes)
+            )
+            post.categories.add(cls.category)
+            Comment.objects.create(post=post, username='reader', content='First')
+            Comment.objects.create(post=post, username='reader', content='Second')
+
+    def export(self, data=None):
+        response = self.client.get(reverse('post_export'), data or {})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_export(self):
+        with self.assertNumQueries(3):
+            posts = self.export()
+
+        self.assertEqual([post['id'] for post in posts], [post.id for post in self.posts])
+        self.assertEqual(posts[0]['categories'][0]['slug'], 'python')
+        self.assertEqual(
+            [comment['content'] for comment in posts[0]['comments']], ['First', 'Second']
+        )
+
+    def test_chunk_comments(self):
+        export = export_posts(Post.objects.order_by('created_time'), chunk_comments=5)
+        with CaptureQueriesContext(connection) as context:
+            chunks = [chunk.splitlines() for chunk in export]
+
+        # Two comments per post, a chunk ends before going above five.
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(len(context.captured_queries), 1 + 2 * 3)
+
+    def test_since(self):
+        since = self.export()[3]['created_time']
+        self.assertEqual(
+            [post['id'] for post in self.export({'since': since})],
+            [post.id for post in self.posts[3:]]
+        )
+        for since in ('yesterday', '2021-13-01T00:00:00'):
+            self.assertEqual(
+                self.client.get(reverse('post_export'), {'since': since}).status_code, 400
+            )
+
+    def test_since_formats(self):
+        since = Post.objects.get(id=self.posts[3].id).created_time
+        expected = [post.id for post in self.posts[3:]]
+        for value in (
+            since.isoformat(),
+            since.isoformat(sep=' '),
+            # Unescaped '+' of the offset within the query string.
+            since.isoformat().replace('+', ' '),
+        ):
+            self.assertEqual(
+                [post['id'] for post in self.export({'since': value})], expected, value
+            )
+
+
+class FeedTestCase(TransactionTestCase):
+    """
+    Check feeds are rendered once per posts generation and answer 304 to
+    clients holding the current copy, the generation is bumped on commit.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Python')
+        self.post = Post.objects.create(title='Post', content='<p>Content</p>')
+        self.post.categories.add(self.category)
+
+    def test_feeds(self):
+        for name, kwargs in (
+            ('latest_posts_rss', {}), ('latest_posts_atom', {}),
+            ('category_posts_rss', {'category': 'python'}),
+            ('category_posts_atom', {'category': 'python'}),
+        ):
+            url = reverse(name, kwargs=kwargs)
+            response = self.client.get(url)
+            self.assertContains(response, self.post.get_absolute_url())
+
+            with self.assertNumQueries(0):
+                cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(cached.status_code, 304)
+
+    def test_regenerated_on_post_change(self):
+        url = reverse('latest_posts_atom')
+        etag = self.client.get(url)['ETag']
+
+        Post.objects.create(title='Newer', content='<p>Content</p>')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Newer')
+
+
+class PostListCacheTestCase(TransactionTestCase):
+    """
+    Check post list fragments are rendered once per posts generation, bumped
+    on commit of every post change, and their hits and misses counted.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(title='Post', content='<p>Content</p>')
+
+    def get_stats(self):
+        staff = User.objects.get_or_create(username='staff', is_staff=True)[0]
+        self.client.force_login(staff)
+        stats = self.client.get(reverse('post_list_cache_stats')).json()
+        self.client.logout()
+        return stats
+
+    def test_rendered_on_post_change(self):
+        url = reverse('post_list')
+        self.assertContains(self.client.get(url), 'Post')
+
+        self.post.title = 'Updated'
+        self.post.save()
+        self.assertContains(self.client.get(url), 'Updated')
+
+        self.post.delete()
+        self.assertNotContains(self.client.get(url), 'Updated')
+
+    def test_stats(self):
+        url = reverse('post_list')
+        self.client.get(url)
+        self.client.get(url)
+        generation = self.get_stats()['generation']
+        self.assertEqual(
+            self.get_stats(),
+            {'generation': generation, 'hits': 1, 'misses': 1, 'hit_ratio': 0.5}
+        )
+
+        Post.objects.create(title='Newer', content='<p>Content</p>')
+        self.client.get(url)
+        stats = self.get_stats()
+        self.assertGreater(stats['generation'], generation)
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+    def test_stats_staff_only(self):
+        url = reverse('post_list_cache_stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(User.objects.create_user('author'))
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+
+class SitemapTestCase(TransactionTestCase):
+    """
+    Check sitemap shards are streamed, cached, and only regenerated when a
+    post of their id range changes, once the change is committed.
+    """
+
+    def setUp(self):
+        cache.clear()
+        Category.objects.create(name='Python')
+        self.posts = [
+            Post.objects.create(title=f'Post {i}', content=f'<p>Content {i}</p>')
+            for i in range(3)
+        ]
+
+    def test_sitemaps(self):
+        response = self.client.get(reverse('sitemap_index'))
+        self.assertContains(response, 'http://testserver/sitemap-posts-0.xml')
+        self.assertContains(response, 'http://testserver/sitemap-categories.xml')
+
+        response = self.client.get(reverse('sitemap_categories'))
+        self.assertContains(response, 'http://testserver/post/python/')
+
+        self.assertEqual(self.client.get(reverse('sitemap_posts', kwargs={'number': 1})).status_code, 404)
+
+    def test_posts_shard(self):
+        url = reverse('sitemap_posts', kwargs={'number': 0})
+        content = b''.join(self.client.get(url).streaming_content).decode()
+        for post in self.posts:
+            self.assertIn(f'<loc>http://testserver{post.get_absolute_url()}</loc>', content)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).content.decode(), content)
+
+        post = Post.objects.create(title='Newer', content='<p>Content</p>')
+        content = b''.join(self.client.get(url).streaming_content).decode()
+        self.assertIn(post.get_absolute_url(), content)
+
+    def test_deleted_post_shard(self):
+        url = reverse('sitemap_posts', kwargs={'number': 0})
+        deleted_url = self.posts[0].get_absolute_url()
+        b''.join(self.client.get(url).streaming_content)
+
+        with transaction.atomic():
+            delete_posts(Post.objects.filter(id=self.posts[0].id))
+            # Not invalidated before the commit, a request in between would
+            # cache the post again.
+            self.assertIn(deleted_url, self.client.get(url).content.decode())
+
+        content = b''.join(self.client.get(url).streaming_content).decode()
+        self.assertNotIn(deleted_url, content)
+
+    def test_commented_post_shard(self):
+        url = reverse('sitemap_posts', kwargs={'number': 0})
+        b''.join(self.client.get(url).streaming_content)
+        self.assertFalse(self.client.get(url).streaming)
+
+        # The comment changes the lastmod of the post.
+        Comment.objects.create(post=self.posts[0], username='reader', content='Comment')
+        self.assertTrue(self.client.get(url).streaming)
+
+
+class ViewCountTestCase(TestCase):
+    """
+    Check post_details counts views and the sidebar lists the most viewed
+    posts, tests write views right away (refer to blog/test_runner.py).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.posts = [
+            Post.objects.create(title=f'Post {i}', content=f'<p>Content {i}</p>')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_views(self):
+        url = reverse('post_details', kwargs={'id': self.posts[1].id})
+        etag = self.client.get(url)['ETag']
+        self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.posts[1].refresh_from_db()
+        self.assertEqual(self.posts[1].views, 2)
+        self.assertContains(self.client.get(reverse('post_list')), 'Post 1</a>')
+
+    def test_add_views(self):
+        add_views({self.posts[0].id: 3, self.posts[2].id: 5})
+
+        self.assertEqual(
+            [(post['title'], post['views']) for post in get_most_viewed()],
+            [('Post 2', 5), ('Post 0', 3)]
+        )
+
+
+class DeletionTestCase(TestCase):
+    """
+    Check delete_posts removes the related rows of posts with a fixed number
+    of queries, and deleting a comment only deletes its own notification.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('author', password='password')
+        cls.author = Author.objects.create(name=cls.user)
+        cls.category = Category.objects.create(name='Python')
+
+    def create_post(self, comments):
+        post = Post.objects.create(
+            author=self.author, title='Post', content='<p>Content</p>'
+        )
+        post.categories.add(self.category)
+        for i in range(comments):
+            Comment.objects.create(post=post, username='reader', content=f'{i}')
+        return post
+
+    def delete_queries(self, comments):
+        post = self.create_post(comments)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(delete_posts(Post.objects.filter(id=post.id)), 1)
+        return len(context.captured_queries)
+
+    def test_delete_posts(self):
+        kept = self.create_post(2)
+        post = self.create_post(3)
+
+        delete_posts(Post.objects.filter(id=post.id))
+
+        self.assertFalse(Post.objects.filter(id=post.id).exists())
+        self.assertFalse(Comment.objects.filter(post_id=post.id).exists())
+        self.assertFalse(Notification.objects.filter(post_id=post.id).exists())
+        self.assertFalse(
+            Post.categories.through.objects.filter(post_id=post.id).exists()
+        )
+        self.assertEqual(kept.comment_set.count(), 2)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.unread_notifications, 2)
+
+    def test_delete_posts_queries(self):
+        self.assertEqual(self.delete_queries(1), self.delete_queries(20))
+
+    def test_comment_delete(self):
+        post = self.create_post(3)
+        comments = list(post.comment_set.order_by('id'))
+        # Viewed, not counted as unread anymore.
+        Notification.objects.filter(comment_id=str(comments[0].id)).update(viewed=True)
+        Author.objects.filter(id=self.author.id).update(unread_notifications=2)
+
+        comments[0].delete()
+        comments[1].delete()
+
+        self.assertEqual(
+            list(Notification.objects.values_list('comment_id', flat=True)),
+            [str(comments[2].id)]
+        )
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.unread_notifications, 1)
+
+
+class NotificationQueueTestCase(TransactionTestCase):
+    """
+    Check a queued notification of a deleted post only drops itself, not the
+    rest of its batch.
+
+    Foreign keys are checked once transactions commit, which TestCase never
+    does.
+    """
+
+    def test_batch_with_deleted_post(self):
+        user = User.objects.create_user('author', password='password')
+        author = Author.objects.create(name=user)
+        post = Post.objects.create(author=author, title='Post', content='<p>Content</p>')
+
+        NotificationQueue().process([(post.id, 1), (post.id + 1, 2), (post.id, 3)])
+
+        self.assertEqual(
+            sorted(Notification.objects.values_list('comment_id', flat=True)),
+            ['1', '3']
+        )
+        author.refresh_from_db()
+        self.assertEqual(author.unread_notifications, 2)
+
+
+class NotificationTestCase(TestCase):
+    """
+    Check marking notifications as read only touches the notifications of the
+    logged-in author, and decrements the unread counter once per notification.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('author', password='password')
+        cls.author = Author.objects.create(name=cls.user)
+        post = Post.objects.create(author=cls.author, title='Post', content='<p>Content</p>')
+        cls.notifications = [
+            Notification.objects.create(post=post, comment_id=str(number))
+            for number in range(3)
+        ]
+
+        other = Author.objects.create(name=User.objects.create_user('other'))
+        other_post = Post.objects.create(author=other, title='Other', content='<p>Content</p>')
+        cls.other_notification = Notification.objects.create(post=other_post, comment_id='3')
+
+        Author.objects.filter(id=cls.author.id).update(unread_notifications=3)
+        Author.objects.filter(id=other.id).update(unread_notifications=1)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def assertUnread(self, unread, other_unread=1):
+        self.assertEqual(
+            list(Notification.objects.filter(viewed=False).order_by('id')),
+            unread + [self.other_notification][:other_unread]
+        )
+        self.assertEqual(
+            list(Author.objects.order_by('id').values_list('unread_notifications', flat=True)),
+            [len(unread), other_unread]
+        )
+
+    def mark_read(self, data):
+        return self.client.post(reverse('notification_mark_read'), data)
+
+    def test_mark_read_ids(self):
+        ids = [self.notifications[0].id, self.other_notification.id]
+        self.assertRedirects(self.mark_read({'ids': ids}), reverse('notification_list'))
+        self.assertUnread(self.notifications[1:])
+
+    def test_mark_read_all(self):
+        self.mark_read({'all': ''})
+        self.assertUnread([])
+
+    def test_mark_read_twice(self):
+        ids = [self.notifications[0].id, self.notifications[1].id]
+        self.mark_read({'ids': ids[:1]})
+        self.mark_read({'ids': ids})
+        self.mark_read({'ids': ids})
+        self.assertUnread(self.notifications[2:])
+
+    def test_details(self):
+        notification = self.notifications[0]
+        url = reverse('notification_details', kwargs={'id': notification.id})
+        response = self.client.get(url)
+        self.assertRedirects(
+            response, notification.get_absolute_url(), fetch_redirect_response=False
+        )
+        self.client.get(url)
+        self.assertUnread(self.notifications[1:])
+
+    def test_details_already_read(self):
+        notification = self.notifications[0]
+        self.mark_read({'all': ''})
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('notification_details', kwargs={'id': notification.id}))
+        for query in context.captured_queries:
+            self.assertNotIn('"unread_notifications"', query['sql'])
+        self.assertUnread([])
+
+
+class SessionUserTestCase(TransactionTestCase):
+    """
+    Check the session and its user with their author are read from the cache,
+    and the cached author follows its unread notifications count, dropped
+    once transactions commit.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('author', password='password')
+        self.author = Author.objects.create(name=self.user)
+        Post.objects.create(author=self.author, title='Post', content='<p>Content</p>')
+        self.client.force_login(self.user)
+
+    def test_cached_session_user(self):
+        url = reverse('post_related_to_author')
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        for query in context.captured_queries:
+            self.assertNotRegex(query['sql'], r'django_session|auth_user|posts_author')
+
+    def test_unread_notifications(self):
+        backend = CachedModelBackend()
+        backend.get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(backend.get_user(self.user.pk).author.unread_notifications, 0)
+
+        add_to_unread_notifications({'pk': self.author.pk}, 2)
+        self.assertEqual(backend.get_user(self.user.pk).author.unread_notifications, 2)
+
+    def test_other_users_stay_cached(self):
+        other = User.objects.create_user('reader', password='password')
+        backend = CachedModelBackend()
+        backend.get_user(self.user.pk)
+
+        other.last_name = 'Reader'
+        other.save()
+        add_to_unread_notifications({'pk': self.author.pk}, 1)
+        backend.get_user(self.user.pk)
+
+        with self.assertNumQueries(0):
+            backend.get_user(self.user.pk)
+        self.user.first_name = 'Author'
+        self.user.save()
+        self.assertEqual(backend.get_user(self.user.pk).first_name, 'Author')
+
+
+@override_settings(POSTS_PAGE_CACHE='pages')
+class PageCacheTestCase(TransactionTestCase):
+    """
+    Check anonymous pages are served from the page cache, and purged by the
+    changes of what they show only.
+
+    Purges run once transactions commit, which TestCase never does.
+    """
+
+    def setUp(self):
+        cache.clear()
+        caches['pages'].clear()
+        self.category = Category.objects.create(name='Python')
+        self.post = Post.objects.create(title='Cached', content='<p>Content</p>')
+        self.post.categories.add(self.category)
+        self.list_url = reverse('post_list')
+        self.category_url = reverse(
+            'post_filter_by_category', kwargs={'category': self.category.slug}
+        )
+        self.details_url = reverse('post_details', kwargs={'id': self.post.id})
+
+    def assertCached(self, url):
+        with self.assertNumQueries(0):
+            return self.client.get(url)
+
+    def test_cached_pages(self):
+        for url in (self.list_url, self.category_url):
+            etag = self.client.get(url)['ETag']
+            self.assertContains(self.assertCached(url), 'Cached')
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_authenticated(self):
+        user = User.objects.create_user('reader', password='password')
+        self.client.force_login(user)
+        self.client.get(self.list_url)
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.list_url)
+        self.assertTrue(context.captured_queries)
+
+    def test_post_purge(self):
+        for url in (self.list_url, self.category_url, self.details_url):
+            self.client.get(url)
+
+        self.post.title = 'Renamed'
+        self.post.save()
+
+        for url in (self.list_url, self.category_url, self.details_url):
+            self.assertContains(self.client.get(url), 'Renamed')
+
+    def test_comment_purge(self):
+        self.client.get(self.list_url)
+        self.client.get(self.details_url)
+
+        Comment.objects.create(post=self.post, username='reader', content='New comment')
+
+        self.assertCached(self.list_url)
+        self.assertContains(self.client.get(self.details_url), 'New comment')
+
+    def test_categories_purge(self):
+        other = Category.objects.create(name='Django')
+        other_url = reverse('post_filter_by_category', kwargs={'category': other.slug})
+        self.client.get(other_url)
+        self.client.get(self.list_url)
+
+        self.post.categories.add(other)
+
+        self.assertContains(self.client.get(other_url), 'Cached')
+        self.assertCached(self.list_url)
+
+    def test_details_views(self):
+        self.client.get(self.details_url)
+        self.client.get(self.details_url)
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 2)
+
+    def test_purge_after_commit(self):
+        self.client.get(self.details_url)
+
+        with transaction.atomic():
+            Comment.objects.create(post=self.post, username='reader', content='Pending')
+            self.assertNotContains(self.client.get(self.details_url), 'Pending')
+
+        self.assertContains(self.client.get(self.details_url), 'Pending')
+
+
+class CategoryTestCase(TestCase):
+    """
+    Check category slugs are unique and never empty, and category pages walk
+    past the cached part of their posting list.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_slugs(self):
+        self.assertEqual(Category.objects.create(name='C#').slug, 'c')
+        self.assertEqual(Category.objects.create(name='C++').slug, 'c-2')
+        self.assertEqual(Category.objects.create(name='#').slug, 'category')
+        self.assertEqual(
+            Category.objects.create(name='A very long category').slug, 'a-very-long-category'
+        )
+        self.assertEqual(
+            Category.objects.create(name='A very long category').slug, 'a-very-long-catego-2'
+        )
+
+        with self.assertRaises(ValidationError):
+            Category(name='#').full_clean()
+
+    def test_backfill_category_slugs(self):
+        category = Category.objects.create(name='Python')
+        Category.objects.filter(id=category.id).update(slug='')
+
+        call_command('backfill_category_slugs', stdout=io.StringIO())
+
+        category.refresh_from_db()
+        self.assertEqual(category.slug, 'python')
+
+    @mock.patch('posts.cache.POSTING_LIST_MAX_KEYS', 8)
+    def test_pages_beyond_posting_list(self):
+        category = Category.objects.create(name='Python')
+        for i in range(15):
+            Post.objects.create(title=f'Post {i}', content='<p>Content</p>')\
+                .categories.add(category)
+
+        titles = []
+        cursor = ''
+        url = reverse('post_filter_by_category', kwargs={'category': 'python'})
+        while cursor is not None:
+            content = self.client.get(url, {'cursor': cursor}).content.decode()
+            titles += re.findall(r'<h2 class="card-title">(.*?)</h2>', content)
+            match = re.search(r'cursor=([\w=-]+)">\s*Next', content)
+            cursor = match.group(1) if match else None
+
+        self.assertEqual(titles, [f'Post {i}' for i in reversed(range(15))])
+
+
+
+class CategoryCacheTestCase(TransactionTestCase):
+    """
+    Check the cached categories and the side widgets fragment listing them
+    are dropped once a category change is committed.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Python')
+        self.url = reverse('post_list')
+
+    def assertCategories(self, names):
+        self.assertEqual([category.name for category in get_categories()], names)
+        response = self.client.get(self.url)
+        for category in Category.objects.all():
+            self.assertContains(response, category.get_absolute_url())
+
+    def test_create(self):
+        self.assertCategories(['Python'])
+        Category.objects.create(name='Django')
+        self.assertCategories(['Python', 'Django'])
+
+    def test_rename(self):
+        self.assertCategories(['Python'])
+        self.category.name = 'Python 3'
+        self.category.save()
+        self.assertCategories(['Python 3'])
+        self.assertContains(self.client.get(self.url), '>Python 3<')
+
+    def test_delete(self):
+        self.assertCategories(['Python'])
+        url = self.category.get_absolute_url()
+        self.category.delete()
+        self.assertCategories([])
+        self.assertNotContains(self.client.get(self.url), url)
+
+
+class CategorySlugUpgradeTestCase(TransactionTestCase):
+    """
+    Check the slug column can be added to a table already holding categories,
+    then backfilled, as the README upgrade steps do.
+
+    SQLite can't alter tables within a transaction, which TestCase is.
+    """
+
+    def test_upgrade(self):
+        field = Category._meta.get_field('slug')
+        with connection.schema_editor() as editor:
+            editor.remove_field(Category, field)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO posts_category (name) VALUES (%s)',
+                [('Python',), ('Python',), ('Django',)]
+            )
+
+        with connection.schema_editor() as editor:
+            editor.add_field(Category, field)
+        call_command('backfill_category_slugs', stdout=io.StringIO())
+
+        self.assertEqual(
+            list(Category.objects.order_by('id').values_list('slug', flat=True)),
+            ['python', 'python-2', 'django']
+        )
+
+
+class SeedBlogTestCase(TestCase):
+    """
+    Check seed_blog run again, after categories were deleted, still gives
+    every new category a unique slug.
+    """
+
+    def seed(self):
+        call_command(
+            'seed_blog', authors=1, categories=2, posts=2, comments=1,
+            seed=1, stdout=io.StringIO()
+        )
+
+    def test_seed_twice(self):
+        self.seed()
+        Category.objects.filter(name='Category 1').delete()
+        self.seed()
+
+        self.assertEqual(
+            list(Category.objects.order_by('id').values_list('name', 'slug')),
+            [('Category 2', 'category-2'), ('Category 2', 'category-2-2'),
+             ('Category 3', 'category-3')]
+        )
+        self.assertEqual(Post.objects.count(), 4)
+
+
+@override_settings(POSTS_THUMBNAIL_PIPELINE='sync')
+class ThumbnailTestCase(TestCase):
+    """
+    Check thumbnails are served from their derivatives at the width of their
+    files, looked up once per thumbnail, and only regenerated on change.
+    """
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_root_setting = override_settings(MEDIA_ROOT=media_root.name)
+        media_root_setting.enable()
+        self.addCleanup(media_root_setting.disable)
+
+        os.makedirs(os.path.join(media_root.name, 'photos'))
+        Image.new('RGB', (600, 300)).save(os.path.join(media_root.name, 'photos/sea.png'))
+        self.post = Post.objects.create(
+            title='Post', thumbnail='photos/sea.png', content='<p>Content</p>'
+        )
+
+    def render(self, variant):
+        return Template(
+            '{% load thumbnails %}{% thumbnail post.thumbnail variant %}'
+        ).render(Context({'post': self.post, 'variant': variant}))
+
+    def test_srcset_widths(self):
+        self.assertIn('/media/derivatives/photos/sea_card_400.jpg 400w', self.render('card'))
+        self.assertNotIn('sea_card_800', self.render('card'))
+        # The original is narrower than the smallest detail width.
+        self.assertIn('/media/derivatives/photos/sea_detail_800.jpg 600w', self.render('detail'))
+
+    def test_cached_lookup(self):
+        self.render('card')
+        with mock.patch('posts.thumbnails.default_storage.exists') as exists:
+            self.assertIn('<picture>', self.render('card'))
+        exists.assert_not_called()
+
+    def test_regenerate_on_change(self):
+        post = Post.objects.get(id=self.post.id)
+        with mock.patch('posts.signals.schedule_derivatives') as schedule:
+            post.title = 'Updated'
+            post.save()
+            schedule.assert_not_called()
+
+            post.thumbnail = 'photos/other.png'
+            post.save()
+            schedule.assert_called_once_with('photos/other.png')
+
+    def test_failure_logged(self):
+        post = Post.objects.get(id=self.post.id)
+        post.thumbnail = 'photos/other.png'
+        with mock.patch('posts.thumbnails.generate_derivatives', side_effect=ValueError), \
+                self.assertLogs('posts.thumbnails', 'ERROR'):
+            post.save()
+        self.assertEqual(str(Post.objects.get(id=post.id).thumbnail), 'photos/other.png')
+
+
+class KeysetPaginationTestCase(TestCase):
+    """
+    Check keyset pages of posts/helpers.py walk every row once in both
+    directions, ties on created_time included, and ignore broken cursors.
+    """
+    ordering = ('-created_time', '-id')
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        # Seconds after now of each post, the middle three share their
+        # created_time, so the pages break ties on id.
+        for i, seconds in enumerate([0, 1, 2, 2, 2, 3, 4]):
+            post = Post.objects.create(title=f'Post {i}', content='<p>Content</p>')
+            Post.objects.filter(id=post.id)\
+                .update(created_time=now + timedelta(seconds=seconds))
+        cls.ids = list(Post.objects.order_by(*cls.ordering).values_list('id', flat=True))
+        cls.keys = list(Post.objects.order_by(*cls.ordering).values_list('created_time', 'id'))
+
+    def paginate(self, cursor=None, **kwargs):
+        request = RequestFactory().get('/', {'cursor': cursor} if cursor else {})
+        return keyset_pagination(request, Post.objects.all(), 3, self.ordering, **kwargs)
+
+    def paginate_keys(self, cursor=None, keys=None, complete=True):
+        request = RequestFactory().get('/', {'cursor': cursor} if cursor else {})
+        return keyset_pagination_of_keys(
+            request, self.keys if keys is None else keys, 3, Post.objects.all(),
+            self.ordering, complete
+        )
+
+    def walk(self, paginate):
+        """
+        Return list of the ids of every page walking forward from the first
+        page, then backward from the last one.
+        """
+        forward = [paginate()]
+        while forward[-1].has_next():
+            forward.append(paginate(forward[-1].next_cursor))
+
+        backward = [forward[-1]]
+        while backward[-1].has_previous():
+            backward.append(paginate(backward[-1].previous_cursor))
+
+        def ids(pages):
+            return [[post.id for post in page] for page in pages]
+
+        return ids(forward), ids(backward)
+
+    def test_cursor_round_trip(self):
+        created_time = timezone.now()
+        cursor = encode_cursor([created_time, 5], 'previous', inclusive=True)
+        self.assertEqual(
+            decode_cursor(cursor, Post, self.ordering),
+            ('previous', [created_time, 5], True)
+        )
+
+    def test_invalid_cursors(self):
+        def encode(payload):
+            return urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+        created_time = str(timezone.now())
+        for cursor in [
+            None, '', 'not base64!', encode('not a list'),
+            encode(['sideways', [created_time, '5'], False]),
+            encode(['next', ['5'], False]),
+            encode(['next', ['not a date', '5'], False]),
+            encode(['next', [created_time, 'not an id'], False]),
+        ]:
+            self.assertIsNone(decode_cursor(cursor, Post, self.ordering), cursor)
+
+        page = self.paginate('not base64!')
+        self.assertEqual([post.id for post in page], self.ids[:3])
+        self.assertFalse(page.has_previous())
+
+    def test_walk(self):
+        pages = [self.ids[:3], self.ids[3:6], self.ids[6:]]
+        self.assertEqual(self.walk(self.paginate), (pages, pages[::-1]))
+
+    def test_first_and_last_pages(self):
+        first = self.paginate()
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_next())
+
+        last = self.paginate(encode_cursor(self.keys[5], 'next'))
+        self.assertEqual([post.id for post in last], self.ids[6:])
+        self.assertFalse(last.has_next())
+
+        # Walking back past the first row shows the first page in full.
+        page = self.paginate(encode_cursor(self.keys[1], 'previous'))
+        self.assertEqual([post.id for post in page], self.ids[:3])
+        self.assertFalse(page.has_previous())
+
+    def test_keyset_filter(self):
+        for i, values in enumerate(self.keys):
+            rows = Post.objects.order_by(*self.ordering).values_list('id', flat=True)
+            self.assertEqual(
+                list(rows.filter(keyset_filter(self.ordering, values))), self.ids[i + 1:]
+            )
+            self.assertEqual(
+                list(rows.filter(keyset_filter(self.ordering, values, inclusive=True))),
+                self.ids[i:]
+            )
+
+    def test_key_comes_before(self):
+        for i, key in enumerate(self.keys):
+            for j, other in enumerate(self.keys):
+                self.assertEqual(key_comes_before(key, other, self.ordering), i < j)
+
+    def test_pagination_of_keys(self):
+        self.assertEqual(self.walk(self.paginate_keys), self.walk(self.paginate))
+
+        # Cursors are interchangeable with the ones of keyset_pagination.
+        cursor = self.paginate().next_cursor
+        self.assertEqual(
+            [post.id for post in self.paginate_keys(cursor)], self.ids[3:6]
+        )
+
+    def test_incomplete_keys(self):
+        keys = self.keys[:5]
+        self.assertEqual(
+            [post.id for post in self.paginate_keys(keys=keys, complete=False)],
+            self.ids[:3]
+        )
+        cursor = encode_cursor(keys[2], 'next')
+        self.assertIsNone(self.paginate_keys(cursor, keys=keys, complete=False))
+
+
+class CommentPaginationTestCase(TestCase):
+    """
+    Check post_details shows the newest comments page, opens the page of
+    ?comment=<id>, and "Load more comments" walks the older ones once each.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.post = Post.objects.create(title='Post', content='<p>Content</p>')
+        cls.other_post = Post.objects.create(title='Other', content='<p>Content</p>')
+
+        now = timezone.now()
+        for i in range(25):
+            comment = Comment.objects.create(
+                post=cls.post, username='reader', content=f'{i}'
+            )
+            Comment.objects.filter(id=comment.id)\
+                .update(created_time=now + timedelta(seconds=i))
+        cls.ids = list(
+            Comment.objects.filter(post=cls.post)
+            .order_by('-created_time', '-id').values_list('id', flat=True)
+        )
+        cls.other_comment = Comment.objects.create(
+            post=cls.other_post, username='reader', content='Other'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def get_comments(self, url, data=None):
+        """
+        Return (comment ids, "Load more comments" fragment URL) of url.
+        """
+        content = self.client.get(url, data or {}).content.decode()
+        ids = [int(id) for id in re.findall(r'<h5 class="mt-0" id="(\d+)">', content)]
+        more = re.search(r'data-url="([^"]+)"', content)
+        return ids, more and html.unescape(more.group(1))
+
+    def test_load_more(self):
+        url = reverse('post_details', kwargs={'id': self.post.id})
+        ids, more = self.get_comments(url)
+        self.assertEqual(ids, self.ids[:10])
+
+        pages = []
+        while more:
+            self.assertTrue(more.startswith(
+                reverse('comment_list', kwargs={'id': self.post.id})
+            ))
+            page, more = self.get_comments(more)
+            pages.append(page)
+        self.assertEqual(pages, [self.ids[10:20], self.ids[20:]])
+
+    def test_comment_list_fragment(self):
+        response = self.client.get(reverse('comment_list', kwargs={'id': self.post.id}))
+        self.assertTemplateUsed(response, 'includes/comment-list.html')
+        self.assertTemplateNotUsed(response, 'post-details.html')
+        self.assertNotContains(response, '<html')
+
+    def test_jump_to_comment(self):
+        url = reverse('post_details', kwargs={'id': self.post.id})
+        ids, more = self.get_comments(url, {'comment': self.ids[14]})
+        self.assertEqual(ids, self.ids[14:24])
+
+        ids, more = self.get_comments(more)
+        self.assertEqual(ids, self.ids[24:])
+        self.assertIsNone(more)
+
+        # Unknown comments, or comments of another post, open the newest page.
+        for comment in ['abc', '0', self.other_comment.id]:
+            ids, _ = self.get_comments(url, {'comment': comment})
+            self.assertEqual(ids, self.ids[:10], comment)
+
+
+class PostTextTestCase(TestCase):
+    """
+    Check the plain text and excerpt of posts follow their content, and are
+    backfilled by backfill_post_text.
+    """
+    content = '<h1>Title</h1>\n<p>Some <strong>bold</strong>&nbsp;text.</p>'
+
+    def test_set_on_save(self):
+        post = Post.objects.create(title='Post', content=self.content)
+        post.refresh_from_db()
+        self.assertEqual(post.plain_text, 'Title Some bold text.')
+        self.assertEqual(post.excerpt, post.plain_text)
+
+        post.content = f'<p>{"word " * 100}</p>'
+        post.save(update_fields=['content'])
+        post.refresh_from_db()
+        self.assertEqual(len(post.excerpt), EXCERPT_LENGTH)
+        self.assertTrue(post.excerpt.endswith('…'))
+
+    def test_not_set_without_content(self):
+        post = Post.objects.create(title='Post', content=self.content)
+        Post.objects.filter(id=post.id).update(plain_text='', excerpt='')
+
+        post.title = 'Updated'
+        post.save(update_fields=['title'])
+        post.refresh_from_db()
+        self.assertEqual(post.plain_text, '')
+
+    def test_backfill_post_text(self):
+        post = Post.objects.create(title='Post', content=self.content)
+        Post.objects.filter(id=post.id).update(plain_text='', excerpt='')
+
+        call_command('backfill_post_text', '--batch-size', '1', stdout=io.StringIO())
+
+        post.refresh_from_db()
+        self.assertEqual(post.plain_text, 'Title Some bold text.')
+        self.assertEqual(post.excerpt, post.plain_text)
+
+
+class CounterFieldsTestCase(TestCase):
+    """
+    Check saving a post never writes its counters back, nor loads its
+    deferred fields, and the counters follow comments and notifications.
+    """
+
+    def setUp(self):
+        post = Post.objects.create(title='Post', content='<p>Content</p>')
+        Post.objects.filter(id=post.id).update(views=5, comment_count=2)
+        self.post = Post.objects.only('id', 'title', 'plain_text').get(id=post.id)
+
+    def test_save_deferred(self):
+        updated_time = Post.objects.get(id=self.post.id).updated_time
+        self.post.title = 'Updated'
+        with CaptureQueriesContext(connection) as context:
+            self.post.save()
+        for query in context.captured_queries:
+            self.assertNotRegex(query['sql'], r'^SELECT .* FROM "posts_post" ')
+
+        post = Post.objects.get(id=self.post.id)
+        self.assertEqual(post.title, 'Updated')
+        self.assertEqual(post.excerpt, 'Content')
+        self.assertGreater(post.updated_time, updated_time)
+        self.assertEqual((post.views, post.comment_count), (5, 2))
+
+    def test_save_update_fields(self):
+        self.post.title = 'Updated'
+        self.post.views = 0
+        self.post.save(update_fields=['title', 'views'])
+
+        post = Post.objects.get(id=self.post.id)
+        self.assertEqual((post.title, post.views), ('Updated', 5))
+
+    def test_save(self):
+        post = Post.objects.get(id=self.post.id)
+        post.title = 'Updated'
+        post.views = 0
+        receiver = mock.Mock()
+        post_save.connect(receiver, sender=Post)
+        self.addCleanup(post_save.disconnect, receiver, sender=Post)
+        post.save()
+
+        self.assertIsNone(receiver.call_args[1]['update_fields'])
+        post = Post.objects.get(id=self.post.id)
+        self.assertEqual((post.title, post.views, post.comment_count), ('Updated', 5, 2))
+
+    def test_save_deleted(self):
+        post = Post.objects.get(id=self.post.id)
+        Post.objects.filter(id=post.id).delete()
+        post.save()
+        self.assertTrue(Post.objects.filter(id=post.id).exists())
+
+    def test_comment_counters(self):
+        author = Author.objects.create(name=User.objects.create_user('author'))
+        post = Post.objects.create(author=author, title='Post', content='<p>Content</p>')
+        comments = [Comment.objects.create(post=post, username='reader', content='Comment')
+                    for _ in range(3)]
+        self.assertCounters(post, author, 3, 3)
+
+        Notification.objects.filter(comment_id=str(comments[0].id)).update(viewed=True)
+        comments[0].delete()
+        comments[1].delete()
+        self.assertCounters(post, author, 1, 2)
+
+    def test_repair_counters(self):
+        author = Author.objects.create(name=User.objects.create_user('author'))
+        post = Post.objects.create(author=author, title='Post', content='<p>Content</p>')
+        comment = Comment.objects.create(post=post, username='reader', content='Comment')
+        Comment.objects.create(post=post, username='reader', content='Comment')
+        Notification.objects.filter(comment_id=str(comment.id)).update(viewed=True)
+
+        Post.objects.update(comment_count=7)
+        Author.objects.update(unread_notifications=0)
+        call_command('repair_counters', stdout=io.StringIO())
+        self.assertCounters(post, author, 2, 1)
+        self.assertEqual(Post.objects.get(id=self.post.id).comment_count, 0)
+
+    def assertCounters(self, post, author, comment_count, unread_notifications):
+        post.refresh_from_db(fields=['comment_count'])
+        author.refresh_from_db(fields=['unread_notifications'])
+        self.assertEqual(
+            (post.comment_count, author.unread_notifications),
+            (comment_count, unread_notifications)
+        )
+
+
+@skipUnless(isinstance(get_search_backend(), SQLiteFTS5Backend), 'FTS5 backend only.')
+class SearchTestCase(TestCase):
+    """
+    Check the FTS5 index follows post saves and deletes, ranks title matches
+    first, and matches user input literally.
+    """
+
+    def search(self, query):
+        return [post.title for post in get_search_backend().search(query)]
+
+    def test_ranking(self):
+        Post.objects.create(title='Other', content='<p>Django, django and django.</p>')
+        Post.objects.create(title='Django', content='<p>Content</p>')
+        self.assertEqual(self.search('django'), ['Django', 'Other'])
+
+    def test_build_match(self):
+        build_match = SQLiteFTS5Backend.build_match
+        self.assertEqual(build_match('django orm opt'), '"django" "orm" "opt"*')
+        self.assertEqual(build_match('title:"x" OR NEAR('), '"title" "x" "OR" "NEAR"*')
+        self.assertEqual(build_match('*"-'), '')
+
+    def test_user_input(self):
+        Post.objects.create(title='Post', content='<p>Near or not</p>')
+        self.assertEqual(self.search('NEAR( OR "not'), ['Post'])
+        self.assertEqual(self.search('title:post'), [])
+        self.assertEqual(self.search('*"-'), [])
+
+    def test_save_and_delete(self):
+        post = Post.objects.create(title='Python', content='<p>Content</p>')
+        self.assertEqual(self.search('pyth'), ['Python'])
+
+        post.title = 'Django'
+        post.save()
+        self.assertEqual(self.search('python'), [])
+        self.assertEqual(self.search('django'), ['Django'])
+
+        post.delete()
+        self.assertEqual(self.search('django'), [])
+
+    def test_rebuild_search_index(self):
+        Post.objects.create(title='Python', content='<p>Content</p>')
+        Post.objects.create(title='Django', content='<p>Content</p>')
+        get_search_backend().clear()
+        self.assertEqual(self.search('content'), [])
+
+        call_command('rebuild_search_index', '--batch-size', '1', stdout=io.StringIO())
+        self.assertEqual(sorted(self.search('content')), ['Django', 'Python'])
+
+    def test_setup_migrated_database(self):
+        with mock.patch.object(SQLiteFTS5Backend, 'setup') as setup:
+            setup_search_index(sender=None, using='default')
+            setup_search_index(sender=None, using='replica')
+        setup.assert_called_once_with('default')
@@ -0,0 +1,198 @@
+"""
+Module for the resized variants (derivatives) of post thumbnails.
+
+Every thumbnail gets a WebP and a JPEG file per variant width, resized down
+(never up) and saved without the metadata of the upload (EXIF, ICC, etc.).
+Files are written next to MEDIA_ROOT under DERIVATIVES_DIRECTORY:
+
+- thumbnail = 'photos/sea.png'
+- derivative_name(thumbnail, 'card', 400, 'webp') returns
+  'derivatives/photos/sea_card_400.webp'.
+
+settings.POSTS_THUMBNAIL_PIPELINE picks where new thumbnails are processed:
+- 'sync' (default) within the saving request, used by tests.
+- 'process' within a pool of worker processes, once the transaction commits.
+
+The derivatives found of each thumbnail are cached, so templates don't look
+them up within the storage on every render, until they're regenerated.
+"""
+
+# Python
+import hashlib
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import PurePosixPath
+
+# Django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+# Third party
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_DIRECTORY = 'derivatives'
+
+DERIVATIVES_KEY = 'posts:thumbnail:{}'
+# Bounds how long derivatives written by another process may be missed, like
+# posts.cache.CACHE_TIMEOUT, not imported as it needs the models.
+DERIVATIVES_TIMEOUT = 60 * 60
+
+# Variant name: widths in pixels, used as srcset candidates by the templates.
+THUMBNAIL_VARIANTS = {
+    'card': (400, 800),
+    'detail': (800, 1200),
+}
+
+# File extension: (Pillow format, save options).
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def derivative_name(name, variant, width, extension):
+    """
+    Return storage name of a thumbnail derivative.
+    """
+    path = PurePosixPath(name)
+    return str(
+        PurePosixPath(DERIVATIVES_DIRECTORY) / path.parent /
+        f'{path.stem}_{variant}_{width}.{extension}'
+    )
+
+
+def generate_derivatives(name, media_root, force=False):
+    """
+    Write every derivative of the thumbnail stored as name within media_root,
+    skipping the ones newer than the original unless force is True.
+
+    Only needs the file system, not Django, so it runs in worker processes.
+    Return the number of written files.
+    """
+    source = os.path.join(media_root, name)
+    source_time = os.path.getmtime(source)
+
+    with Image.open(source) as original:
+        # Apply the EXIF orientation before it's dropped with the metadata.
+        image = ImageOps.exif_transpose(original).convert('RGB')
+
+    written = 0
+    for variant, widths in THUMBNAIL_VARIANTS.items():
+        for width in widths:
+            # Don't upscale, a width above the original is only written for
+            # the smallest candidate, so every variant has at least one file.
+            if width > image.width and width != widths[0]:
+                continue
+
+            resized = image
+            if image.width > width:
+                height = round(image.height * width / image.width)
+                resized = image.resize((width, height), Image.LANCZOS)
+
+            for extension, (image_format, options) in THUMBNAIL_FORMATS.items():
+                target = os.path.join(
+                    media_root, derivative_name(name, variant, width, extension)
+                )
+                if not force and os.path.exists(target) and \
+                        os.path.getmtime(target) >= source_time:
+                    continue
+
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                resized.save(target, image_format, **options)
+                written += 1
+
+    return written
+
+
+def find_derivatives(name):
+    """
+    Return dict of variant: list of (width, actual width) of the JPEG
+    derivatives of the thumbnail stored as name found within the storage, the
+    actual width is below width when the original is narrower.
+    """
+    derivatives = {}
+    for variant, widths in THUMBNAIL_VARIANTS.items():
+        derivatives[variant] = []
+        for width in widths:
+            target = derivative_name(name, variant, width, 'jpg')
+            if not default_storage.exists(target):
+                continue
+            # Only the header is read.
+            with default_storage.open(target) as file, Image.open(file) as image:
+                derivatives[variant].append((width, image.width))
+
+    return derivatives
+
+
+def get_derivatives_key(name):
+    return DERIVATIVES_KEY.format(hashlib.md5(name.encode()).hexdigest())
+
+
+def get_derivatives(name):
+    """
+    Return the derivatives of the thumbnail stored as name, refer to
+    find_derivatives, looked up within the storage only on cache miss.
+    """
+    key = get_derivatives_key(name)
+    derivatives = cache.get(key)
+    if derivatives is None:
+        derivatives = find_derivatives(name)
+        cache.set(key, derivatives, DERIVATIVES_TIMEOUT)
+
+    return derivatives
+
+
+def invalidate_derivatives(name):
+    cache.delete(get_derivatives_key(name))
+
+
+executor = None
+
+
+def get_executor():
+    global executor
+    if executor is None:
+        executor = ProcessPoolExecutor(
+            max_workers=getattr(settings, 'POSTS_THUMBNAIL_WORKERS', None)
+        )
+    return executor
+
+
+def log_failure(future):
+    if future.exception():
+        logger.error('Thumbnail derivatives failed.', exc_info=future.exception())
+
+
+def schedule_derivatives(name):
+    """
+    Generate the derivatives of a newly saved thumbnail according to
+    settings.POSTS_THUMBNAIL_PIPELINE.
+    """
+    if not name:
+        return
+
+    media_root = str(settings.MEDIA_ROOT)
+    if getattr(settings, 'POSTS_THUMBNAIL_PIPELINE', 'sync') == 'process':
+        def done(future):
+            invalidate_derivatives(name)
+            log_failure(future)
+
+        transaction.on_commit(
+            lambda: get_executor().submit(
+                generate_derivatives, name, media_root
+            ).add_done_callback(done)
+        )
+    else:
+        # Any failure is logged, as log_failure does for the process pipeline,
+        # the post is saved whatever the image holds.
+        try:
+            generate_derivatives(name, media_root)
+        except Exception:
+            logger.exception('Thumbnail derivatives of %s failed.', name)
+        invalidate_derivatives(name)
@@ -1,21 +1,39 @@
 # Django
+from django.conf import settings
 from django.urls import path
 
 # Local apps
-from posts import views
+from posts import async_views, feeds, sitemaps, views
+
+
+# Public read-only views, async under ASGI, refer to posts/async_views.py.
+read_views = async_views if getattr(settings, 'POSTS_ASYNC_VIEWS', False) else views
 
 
 urlpatterns = [
-    path('', views.post_list, name='post_list'),
+    path('', read_views.post_list, name='post_list'),
     path('post-author/', views.post_related_to_author, name='post_related_to_author'),
     path('post-create/', views.post_create, name='post_create'),
-    path('post-search/', views.post_search, name='post_search'),
+    path('post-list-cache-stats/', views.post_list_cache_stats, name='post_list_cache_stats'),
+    path('post-export/', views.post_export, name='post_export'),
+    path('post-search/', read_views.post_search, name='post_search'),
     path('post-delete/<int:id>/', views.post_delete, name='post_delete'),
     path('post-update/<int:id>/', views.post_update, name='post_update'),
     path('post/<int:id>/comment-create/', views.comment_create, name='comment_create'),
-    path('post/<int:id>/', views.post_details, name='post_details'),
-    path('post/<str:category>/', views.post_filter_by_category, name='post_filter_by_category'),
+    path('post/<int:id>/comments/', views.comment_list, name='comment_list'),
+    path('post/<int:id>/', read_views.post_details, name='post_details'),
+    path('post/<slug:category>/', read_views.post_filter_by_category, name='post_filter_by_category'),
+
+    path('feed/rss/', feeds.latest_posts_rss, name='latest_posts_rss'),
+    path('feed/atom/', feeds.latest_posts_atom, name='latest_posts_atom'),
+    path('feed/<slug:category>/rss/', feeds.category_posts_rss, name='category_posts_rss'),
+    path('feed/<slug:category>/atom/', feeds.category_posts_atom, name='category_posts_atom'),
+
+    path('sitemap.xml', sitemaps.sitemap_index, name='sitemap_index'),
+    path('sitemap-categories.xml', sitemaps.sitemap_categories, name='sitemap_categories'),
+    path('sitemap-posts-<int:number>.xml', sitemaps.sitemap_posts, name='sitemap_posts'),
 
     path('notification/', views.notification_list, name='notification_list'),
+    path('notification/mark-read/', views.notification_mark_read, name='notification_mark_read'),
     path('notification/<int:id>/', views.notification_details, name='notification_details'),
 ]
@@ -0,0 +1,165 @@
+"""
+Module for the post views counter, Post.views, and the most viewed posts.
+
+Writing every view right away would take the SQLite write lock on every read
+of a post, so settings.POSTS_VIEW_COUNTER picks how views are written:
+- 'sync' (default) adds each view with its own UPDATE, used by tests.
+- 'buffer' adds views to an in-process buffer, a worker thread writes the
+  buffer every flush_interval seconds, or as soon as it holds threshold views,
+  with one UPDATE per batch of posts. Views of a process that gets killed
+  before its flush are lost.
+
+The most viewed posts, rendered by the sidebar, are a cached snapshot
+refreshed after each flush.
+"""
+
+# Python
+import atexit
+import logging
+import threading
+from collections import Counter
+from functools import wraps
+
+# Django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Case, F, IntegerField, Value, When
+
+# Local apps
+from blog.routers import read_primary
+from posts.cache import CACHE_TIMEOUT
+from posts.models import Post
+
+
+logger = logging.getLogger(__name__)
+
+MOST_VIEWED_KEY = 'posts:most_viewed'
+MOST_VIEWED_COUNT = 5
+
+# Posts per UPDATE, keeps the statement below SQLite parameters limit.
+FLUSH_BATCH_SIZE = 300
+
+
+def add_views(views):
+    """
+    Add views, a mapping of Post id: views, to the posts with one UPDATE per
+    FLUSH_BATCH_SIZE posts, then refresh the most viewed posts snapshot.
+    """
+    post_ids = list(views)
+    for start in range(0, len(post_ids), FLUSH_BATCH_SIZE):
+        batch = post_ids[start:start + FLUSH_BATCH_SIZE]
+        Post.objects.filter(id__in=batch).update(views=F('views') + Case(
+            *[When(id=post_id, then=Value(views[post_id])) for post_id in batch],
+            default=Value(0), output_field=IntegerField(),
+        ))
+
+    if post_ids:
+        refresh_most_viewed()
+
+
+def get_most_viewed():
+    """
+    Return list of the most viewed posts as dicts of id, title and views, read
+    from the database only on cache miss.
+    """
+    most_viewed = cache.get(MOST_VIEWED_KEY)
+    if most_viewed is None:
+        most_viewed = refresh_most_viewed()
+    return most_viewed
+
+
+def refresh_most_viewed():
+    with read_primary():
+        most_viewed = list(
+            Post.objects.filter(views__gt=0).order_by('-views', '-id')
+            .values('id', 'title', 'views')[:MOST_VIEWED_COUNT]
+        )
+    cache.set(MOST_VIEWED_KEY, most_viewed, CACHE_TIMEOUT)
+    return most_viewed
+
+
+def invalidate_most_viewed():
+    cache.delete(MOST_VIEWED_KEY)
+
+
+class ViewCountBuffer:
+    """
+    In-process Post id: views buffer, written by a daemon worker thread.
+    """
+
+    def __init__(self, flush_interval=10, threshold=1000):
+        self.flush_interval = flush_interval
+        self.threshold = threshold
+        self.views = Counter()
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.full = threading.Event()
+        self.worker = None
+
+    def add(self, post_id):
+        self.start()
+        with self.lock:
+            self.views[post_id] += 1
+            self.pending += 1
+            if self.pending >= self.threshold:
+                self.full.set()
+
+    def start(self):
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(
+                    target=self.run, name='view-count-buffer', daemon=True
+                )
+                self.worker.start()
+
+    def run(self):
+        while True:
+            self.full.wait(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered views within the calling thread.
+        """
+        with self.lock:
+            views, self.views = self.views, Counter()
+            self.pending = 0
+            self.full.clear()
+
+        if not views:
+            return
+
+        close_old_connections()
+        try:
+            add_views(views)
+        except Exception:
+            logger.exception('Failed to write views of %d posts.', len(views))
+        finally:
+            close_old_connections()
+
+
+view_count_buffer = ViewCountBuffer()
+atexit.register(view_count_buffer.flush)
+
+
+def count_view(post_id):
+    if getattr(settings, 'POSTS_VIEW_COUNTER', 'sync') == 'buffer':
+        view_count_buffer.add(post_id)
+    else:
+        add_views({post_id: 1})
+
+
+def counts_post_views(view):
+    """
+    Count a view of the post of view(request, id) on every 200 or 304
+    response, so conditional GETs count too.
+    """
+    @wraps(view)
+    def wrapper(request, id, **kwargs):
+        response = view(request, id, **kwargs)
+        if response.status_code in (200, 304):
+            count_view(id)
+        return response
+
+    return wrapper
@@ -1,55 +1,178 @@
+# Python
+import re
+
 # Django
+from django.conf import settings
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Q
+from django.db import router
+from django.db.models import F
+from django.http import (HttpResponseBadRequest, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect, render, reverse
-from django.views.decorators.http import (require_GET, require_http_methods,
-                                          require_POST)
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import (condition, require_GET,
+                                          require_http_methods, require_POST)
 # Local apps
+from blog.routers import primary_write, replica_read
+from posts.cache import (get_categories, get_category_post_keys,
+                         get_post_list_cache_stats, get_post_list_fragment)
+from posts.conditional import (post_etag, post_last_modified, posts_etag,
+                               posts_last_modified)
+from posts.counters import add_to_unread_notifications
+from posts.deletion import delete_posts
+from posts.export import export_posts, iterate_in_thread
 from posts.forms import CommentForm, PostForm
-from posts.helpers import pagination
-from posts.models import Category, Notification, Post
+from posts.helpers import (keyset_cursor_at, keyset_pagination,
+                           keyset_pagination_of_keys, pagination)
+from posts.models import Comment, Notification, Post
+from posts.page_cache import cache_anonymous_page
+from posts.search import get_search_backend
+from posts.view_counts import counts_post_views
+
+
+# Keyset pagination orderings, id breaks created_time ties.
+POST_ORDERING = ('-created_time', '-id')
+COMMENT_ORDERING = ('-created_time', '-id')
+COMMENTS_PER_PAGE = 10
+
+# Fields rendered by includes/post-cards.html, content is never loaded.
+POST_CARD_FIELDS = ('id', 'thumbnail', 'title', 'excerpt', 'created_time')
+
+# Time followed by a space and a UTC offset, the space being a decoded '+'.
+UNESCAPED_UTC_OFFSET = re.compile(
+    r'(\d{1,2}:\d{1,2}(?::\d{1,2}(?:[.,]\d+)?)?) (\d{2}(?::?\d{2})?)$'
+)
 
 
 @require_GET
+@replica_read
+@cache_anonymous_page(lambda request: ['list'])
+@condition(etag_func=posts_etag, last_modified_func=posts_last_modified)
 def post_list(request):
-    posts = Post.objects.only('id', 'thumbnail', 'title', 'created_time')
+    cursor = request.GET.get('cursor', '')
+
+    def render_posts():
+        posts = Post.objects.only(*POST_CARD_FIELDS)
+        return render_to_string('includes/post-cards.html', {
+            'posts': keyset_pagination(request, posts, 6, POST_ORDERING),
+        }, request)
 
     context = {
         'title': 'Home page',
-        'posts': pagination(request, posts, 6),
-        'categories': Category.objects.all(),
+        'posts_html': get_post_list_fragment(f'all:{cursor}', render_posts),
+        'categories': get_categories,
     }
 
     return render(request, 'post-list.html', context)
 
 
 @require_GET
+@replica_read
+@cache_anonymous_page(lambda request, category=None: [f'category:{category}'])
+@condition(etag_func=posts_etag, last_modified_func=posts_last_modified)
 def post_filter_by_category(request, category=None):
     """
-    Return Post QuerySet filtered by the category argument, if category is None,
-    view will return empty QuerySet.
+    Return Post QuerySet filtered by the category slug argument, if category is
+    None or not found, view will return empty QuerySet.
+
+    With settings.POSTS_CATEGORY_POSTING_LISTS, the page is cut from the cached
+    posting list of the category and only its posts are fetched by id.
     """
-    if category:
-        posts = Post.objects.filter(categories__name__icontains=category)\
-            .only('id', 'thumbnail', 'title', 'created_time')
-    else:
-        posts = Post.objects.none()
+    cursor = request.GET.get('cursor', '')
+    category_object = next(
+        (item for item in get_categories() if item.slug == category), None
+    )
+
+    def render_posts():
+        posts = Post.objects.only(*POST_CARD_FIELDS)
+        if category_object is None:
+            page = keyset_pagination(request, posts.none(), 6, POST_ORDERING)
+        else:
+            page = None
+            if getattr(settings, 'POSTS_CATEGORY_POSTING_LISTS', False):
+                keys, complete = get_category_post_keys(category_object.id, POST_ORDERING)
+                page = keyset_pagination_of_keys(
+                    request, keys, 6, posts, POST_ORDERING, complete
+                )
+            # Without posting lists, or beyond the cached part of the list.
+            if page is None:
+                posts = posts.filter(categories=category_object)
+                page = keyset_pagination(request, posts, 6, POST_ORDERING)
+
+        return render_to_string('includes/post-cards.html', {
+            'posts': page,
+        }, request)
 
     context = {
-        'title': f'{category} posts',
-        'posts': pagination(request, posts, 6),
-        'categories': Category.objects.all(),
+        'title': f'{category_object or category} posts',
+        'posts_html': get_post_list_fragment(
+            f'category:{category}:{cursor}', render_posts
+        ),
+        'categories': get_categories,
     }
 
     return render(request, 'post-list.html', context)
 
+
 @require_GET
+@replica_read
+def post_export(request):
+    """
+    Stream every post, oldest first, with its categories and comments as
+    newline-delimited JSON, refer to posts/export.py.
+
+    request.GET['since'] (ISO 8601 datetime, e.g. 2021-02-01T10:00:00.123Z)
+    keeps the posts created at or after it, for incremental pulls pass the
+    created_time of the last received post, that post is sent again.
+    """
+    posts = Post.objects.order_by('created_time', 'id')
+
+    since = request.GET.get('since')
+    if since:
+        # A '+' of the UTC offset is decoded as space when it isn't escaped.
+        since = UNESCAPED_UTC_OFFSET.sub(r'\1+\2', since)
+        try:
+            since_time = parse_datetime(since)
+        # Well formatted, but not a valid date, e.g. month 13.
+        except ValueError:
+            since_time = None
+        if since_time is None:
+            return HttpResponseBadRequest('since must be an ISO 8601 datetime.')
+        if timezone.is_naive(since_time):
+            since_time = timezone.make_aware(since_time)
+        posts = posts.filter(created_time__gte=since_time)
+
+    # Rows are read while the response streams, after replica_read returned,
+    # so the database is picked now.
+    posts = posts.using(router.db_for_read(Post))
+
+    content = export_posts(posts)
+    if getattr(settings, 'POSTS_STREAM_IN_THREAD', False):
+        content = iterate_in_thread(content)
+
+    return StreamingHttpResponse(content, content_type='application/x-ndjson')
+
+
+@require_GET
+@staff_member_required
+def post_list_cache_stats(request):
+    """
+    Return hits and misses of the post list fragment cache, to size the cache.
+    """
+    return JsonResponse(get_post_list_cache_stats())
+
+
+@require_GET
+@replica_read
 def post_search(request):
     """
-    Return Post QuerySet filtered by the request.GET['query'], if the query is
-    empty or space view will return empty QuerySet.
+    Return Post QuerySet matching the request.GET['query'] ranked by relevance,
+    if the query is empty or space view will return empty QuerySet.
 
     context['query'] is the query value, passed within HttpResponse, to receive
     it within HttpRequest, so that it be possible to paginate the search
@@ -59,16 +182,14 @@ def post_search(request):
     """
     query = request.GET.get('query')
     if query and not query.isspace():
-        posts = Post.objects.filter(
-            Q(title__icontains=query) | Q(content__icontains=query)
-        )
+        posts = get_search_backend().search(query).only(*POST_CARD_FIELDS)
     else:
         posts = Post.objects.none()
 
     context = {
         'title': 'Search results',
         'posts': pagination(request, posts, 6),
-        'categories': Category.objects.all(),
+        'categories': get_categories,
         'query': query
     }
 
@@ -96,7 +217,7 @@ def post_create(request):
 
         context = {
             'title': 'Create Post.',
-            'categories': Category.objects.all(),
+            'categories': get_categories,
             'form': form,
         }
 
@@ -130,7 +251,7 @@ def post_update(request, id):
 
         context = {
             'title': 'Create Post.',
-            'categories': Category.objects.all(),
+            'categories': get_categories,
             'form': form,
         }
 
@@ -143,6 +264,7 @@ def post_update(request, id):
 
 
 @require_GET
+@primary_write
 @login_required(login_url="accounts_login")
 def post_delete(request, id):
     """
@@ -153,7 +275,7 @@ def post_delete(request, id):
 
         post = get_object_or_404(Post, id=id)
         messages.success(request, f'{post.title} deleted.')
-        post.delete()
+        delete_posts(Post.objects.filter(id=post.id))
         return redirect('post_list')
 
     # If logged-in User is not an Author.
@@ -163,17 +285,59 @@ def post_delete(request, id):
 
 
 @require_GET
+@replica_read
+@counts_post_views
+@cache_anonymous_page(lambda request, id: [f'post:{id}'])
+@condition(etag_func=post_etag, last_modified_func=post_last_modified)
 def post_details(request, id):
+    """
+    Return post with the newest page of its comments, the older comments are
+    loaded on demand from comment_list.
+
+    request.GET['comment'] (set by Notification.get_absolute_url) opens the
+    comments page starting with that comment.
+    """
     post = get_object_or_404(Post, id=id)
 
+    comments = Comment.objects.filter(post=post)
+    cursor = None
+    comment_id = request.GET.get('comment', '')
+    if comment_id.isdigit():
+        comment = comments.only('id', 'created_time').filter(id=comment_id).first()
+        if comment:
+            cursor = keyset_cursor_at(comment, COMMENT_ORDERING)
+
     context = {
-        'categories': Category.objects.all(),
+        'categories': get_categories,
         'post': post,
+        'post_id': post.id,
+        'comments': keyset_pagination(
+            request, comments, COMMENTS_PER_PAGE, COMMENT_ORDERING, cursor
+        ),
     }
 
     return render(request, 'post-details.html', context)
 
 
+@require_GET
+@replica_read
+def comment_list(request, id):
+    """
+    Return HTML fragment of the comments page after request.GET['cursor'],
+    fetched by post-details.html "Load more comments" link.
+    """
+    comments = Comment.objects.filter(post_id=id)
+
+    context = {
+        'post_id': id,
+        'comments': keyset_pagination(
+            request, comments, COMMENTS_PER_PAGE, COMMENT_ORDERING
+        ),
+    }
+
+    return render(request, 'includes/comment-list.html', context)
+
+
 @require_GET
 @login_required(login_url="accounts_login")
 def post_related_to_author(request):
@@ -182,12 +346,12 @@ def post_related_to_author(request):
     """
     try:
         author = request.user.author
-        posts = Post.objects.filter(author=author).only('id', 'title')
+        posts = Post.objects.filter(author=author).only(*POST_CARD_FIELDS)
 
         if posts.exists():
             context = {
                 'posts': pagination(request, posts, 6),
-                'categories': Category.objects.all()
+                'categories': get_categories
             }
             return render(request, 'post-list.html', context)
         else:
@@ -228,17 +392,18 @@ def notification_list(request):
 
         notifications = Notification.objects.select_related('post').\
             filter(post__author=author)
+        notifications = keyset_pagination(request, notifications, 20, ('-id',))
 
-        if notifications.exists():
+        if notifications:
             title = 'Notifications'
-            notifications = pagination(request, notifications, 20)
         else:
             title = 'No notifications'
             notifications = None
 
         context = {
             'title': title,
-            'notifications': notifications
+            'notifications': notifications,
+            'categories': get_categories,
         }
 
         return render(request, 'notifications.html', context)
@@ -249,13 +414,57 @@ def notification_list(request):
         return redirect('post_list')
 
 
+@require_POST
+@login_required(login_url="accounts_login")
+def notification_mark_read(request):
+    """
+    Mark notifications of the logged-in Author as viewed with a single UPDATE,
+    all of them if request.POST['all'] is sent, otherwise the ones listed
+    within request.POST['ids'].
+    """
+    try:
+        author = request.user.author
+
+        notifications = Notification.objects.filter(
+            post__author=author, viewed=False
+        )
+        if 'all' not in request.POST:
+            ids = [id for id in request.POST.getlist('ids') if id.isdigit()]
+            notifications = notifications.filter(id__in=ids)
+
+        marked = notifications.update(viewed=True)
+        if marked:
+            add_to_unread_notifications(
+                {'pk': author.pk}, -marked, user_ids=[request.user.pk]
+            )
+
+        messages.success(request, f'{marked} notifications marked as read.')
+        return redirect('notification_list')
+
+    # If logged-in User is not an Author.
+    except ObjectDoesNotExist:
+        messages.warning(request, 'Not authorized.')
+        return redirect('post_list')
+
+
 @require_GET
+@primary_write
 def notification_details(request, id):
     """
     Change state (notification.viewed) and redirect.
+
+    The state is changed with a conditional UPDATE, so only the request that
+    really flips it decrements the unread notifications counter.
     """
-    notification = Notification.objects.get(id=id)
-    notification.viewed = True
-    notification.save()
+    notification = get_object_or_404(
+        Notification.objects.only('id', 'post_id', 'comment_id')
+        .annotate(author_user_id=F('post__author__name_id')),
+        id=id
+    )
+    if Notification.objects.filter(id=id, viewed=False).update(viewed=True):
+        add_to_unread_notifications(
+            {'post__id': notification.post_id}, -1,
+            user_ids=[notification.author_user_id],
+        )
 
     return redirect(notification.get_absolute_url())